@@ -3,10 +3,16 @@ import sqlite3
 import pandas as pd
 import os
 from datetime import datetime
+import stats
+import backup
+import export
+import repository
 
 # --- KONFIGURACIJA ---
 st.set_page_config(page_title="Discord Bot Admin", layout="wide", page_icon="🎓")
 DB_FILE = os.getenv('DATABASE_PATH', 'studij.db')
+# Prenos v brskalniku Streamlit drži v pomnilniku; večje datoteke se pobere z diska strežnika
+DOWNLOAD_MAX_MB = int(os.getenv('DOWNLOAD_MAX_MB', '50'))
 
 # --- CSS STILI (MINIMALNI - LE ZA GUMBE) ---
 st.markdown("""
@@ -38,47 +44,81 @@ def get_data(query, params=()):
     except Exception:
         return pd.DataFrame()
 
-# --- PAMETNO BRISANJE SMERI (CASCADING DELETE) ---
-def delete_program_full(prog_id):
-    """Izbriše smer in VSE, kar spada zraven (letnike, semestre, predmete, roke, gradiva)."""
-    with sqlite3.connect(DB_FILE) as conn:
-        cur = conn.cursor()
-        
-        # 1. Najdi vse letnike te smeri
-        cur.execute("SELECT id FROM years WHERE program_id=?", (prog_id,))
-        years = [r[0] for r in cur.fetchall()]
-        
-        for yid in years:
-            # 2. Najdi vse semestre teh letnikov
-            cur.execute("SELECT id FROM semesters WHERE year_id=?", (yid,))
-            sems = [r[0] for r in cur.fetchall()]
-            
-            for sid in sems:
-                # 3. Najdi vse predmete teh semestrov
-                cur.execute("SELECT id FROM subjects WHERE semester_id=?", (sid,))
-                subjs = [r[0] for r in cur.fetchall()]
-                
-                for sub_id in subjs:
-                    # 4. Izbriši gradiva in roke
-                    cur.execute("DELETE FROM materials WHERE subject_id=?", (sub_id,))
-                    cur.execute("DELETE FROM deadlines WHERE subject_id=?", (sub_id,))
-                
-                # 5. Izbriši predmete
-                cur.execute("DELETE FROM subjects WHERE semester_id=?", (sid,))
-            
-            # 6. Izbriši semestre
-            cur.execute("DELETE FROM semesters WHERE year_id=?", (yid,))
-        
-        # 7. Izbriši letnike
-        cur.execute("DELETE FROM years WHERE program_id=?", (prog_id,))
-        
-        # 8. Končno izbriši smer
-        cur.execute("DELETE FROM study_programs WHERE id=?", (prog_id,))
-        conn.commit()
+# --- STRANI IN ISKANJE (LIMIT/OFFSET NA STREŽNIKU) ---
+PAGE_SIZE = 50
+
+def search_clause(search, columns):
+    """Vrne (WHERE del, parametri) za iskanje po podanih stolpcih."""
+    if not search:
+        return "", ()
+    like = f"%{search}%"
+    return " WHERE (" + " OR ".join(f"{c} LIKE ?" for c in columns) + ")", (like,) * len(columns)
+
+def get_page(query, params=(), key="", page_size=PAGE_SIZE):
+    """Prebere samo eno stran rezultatov; vrne (DataFrame, skupno število vrstic)."""
+    total = get_data(f"SELECT COUNT(*) as c FROM ({query})", params)
+    total = int(total['c'][0]) if not total.empty else 0
+    pages = max(1, -(-total // page_size))
+    page = st.number_input(f"Stran (skupaj {pages})", 1, pages, 1, key=f"page_{key}") if pages > 1 else 1
+    df = get_data(f"{query} LIMIT ? OFFSET ?", tuple(params) + (page_size, (page - 1) * page_size))
+    return df, total
+
+def labels(df, col, id_col='id'):
+    """Slovar id -> oznaka za format_func (namesto iskanja po DataFrame za vsako opcijo)."""
+    return dict(zip(df[id_col], df[col]))
+
+def search_picker(label, query, columns, label_sql, key):
+    """Izbirnik z iskanjem: v selectbox naloži le prvih PAGE_SIZE zadetkov."""
+    search = st.text_input(f"🔍 {label} (iskanje)", key=f"q_{key}")
+    where, params = search_clause(search, columns)
+    df = get_data(f"SELECT id, {label_sql} as label FROM ({query}){where} ORDER BY label LIMIT ?", params + (PAGE_SIZE,))
+    if df.empty:
+        return None
+    names = labels(df, 'label')
+    return st.selectbox(label, df['id'], format_func=names.__getitem__, key=key)
+
+# --- PISANJE, KI ZAJEMA VEČ TABEL (SKUPNE FUNKCIJE IZ repository.py) ---
+def run_write(fn, *args):
+    try:
+        with sqlite3.connect(DB_FILE) as conn:
+            return fn(conn, *args)
+    except sqlite3.Error as e:
+        st.error(f"Napaka v bazi: {e}")
+        return None
+
+# --- PRENOS DATOTEK ---
+def forget_download(key):
+    st.session_state.pop(key, None)
+
+def offer_download(path, mime, key, prepare_label="📦 Pripravi prenos"):
+    """Prenos datoteke z diska: vsebina se prebere šele na izrecno zahtevo in pozabi po prenosu."""
+    try:
+        velikost = os.path.getsize(path)
+    except FileNotFoundError:
+        st.warning(f"Datoteka `{os.path.basename(path)}` ne obstaja več (morda jo je pobrisala rotacija).")
+        forget_download(key)
+        return
+    if velikost > DOWNLOAD_MAX_MB * 1024 * 1024:
+        st.warning(f"Datoteka ima {velikost / 1024 / 1024:.1f} MB, kar presega omejitev prenosa ({DOWNLOAD_MAX_MB} MB). "
+                   f"Na strežniku: `{path}`")
+        return
+    if st.session_state.get(key) != path:
+        if not st.button(f"{prepare_label} ({velikost / 1024 / 1024:.1f} MB)", key=f"{key}_pripravi"):
+            return
+        st.session_state[key] = path
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        st.warning(f"Datoteka `{os.path.basename(path)}` ne obstaja več (morda jo je pobrisala rotacija).")
+        forget_download(key)
+        return
+    st.download_button(f"⬇️ Prenesi {os.path.basename(path)}", data, file_name=os.path.basename(path), mime=mime,
+                       key=f"{key}_prenos", on_click=forget_download, args=(key,))
 
 # --- SIDEBAR ---
 st.sidebar.title("🎓 Admin Panel")
-menu = st.sidebar.radio("Meni:", ["🏠 Domov (Statistika)", "📝 Pregled in Urejanje", "➕ Dodajanje Podatkov"])
+menu = st.sidebar.radio("Meni:", ["🏠 Domov (Statistika)", "📝 Pregled in Urejanje", "➕ Dodajanje Podatkov", "💾 Varnostne Kopije", "📤 Izvoz"])
 st.sidebar.markdown("---")
 st.sidebar.info("Podatki so shranjeni v `studij.db`.")
 
@@ -88,17 +128,29 @@ st.sidebar.info("Podatki so shranjeni v `studij.db`.")
 if menu == "🏠 Domov (Statistika)":
     st.title("📊 Pregled Stanja")
     
-    test = get_data("SELECT name FROM sqlite_master WHERE type='table' AND name='subjects'")
-    if test.empty:
+    # Ena poizvedba nad tabelo stats (vzdržujejo jo prožilci, glej stats.py)
+    snapshot = get_data(stats.SNAPSHOT_QUERY)
+    if snapshot.empty:
         st.warning("⚠️ Baza še ni ustvarjena. Zaženi `main.py` vsaj enkrat.")
     else:
-        try:
-            c1, c2, c3, c4 = st.columns(4)
-            c1.metric("📚 Predmeti", get_data("SELECT COUNT(*) as c FROM subjects")['c'][0])
-            c2.metric("📂 Gradiva", get_data("SELECT COUNT(*) as c FROM materials")['c'][0])
-            c3.metric("⏳ Roki", get_data("SELECT COUNT(*) as c FROM deadlines WHERE date_time >= DATE('now')")['c'][0])
-            c4.metric("🎓 Smeri", get_data("SELECT COUNT(*) as c FROM study_programs")['c'][0])
-        except: pass
+        povzetek = stats.summarize(snapshot.itertuples(index=False, name=None))
+        g, b = povzetek["global"], povzetek["buckets"]
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("📚 Predmeti", g.get('subjects', 0))
+        c2.metric("📂 Gradiva", g.get('materials', 0))
+        c3.metric("⏳ Roki", b['week'] + b['month'] + b['later'])
+        c4.metric("🎓 Smeri", g.get('study_programs', 0))
+
+        with st.expander("📈 Po smereh in strežnikih"):
+            st.dataframe(pd.DataFrame([
+                {"Smer": p["name"], "Predmeti": p.get("subjects", 0), "Gradiva": p.get("materials", 0), "Roki": p.get("deadlines", 0)}
+                for p in povzetek["program"].values()
+            ]), use_container_width=True, hide_index=True)
+            st.dataframe(pd.DataFrame([
+                {"Strežnik": "🌍 Globalno" if gid == 0 else str(gid), "Gradiva": v.get("materials", 0), "Roki": v.get("deadlines", 0),
+                 "Roki (7 dni)": povzetek["guild_buckets"].get(gid, {}).get("week", 0)}
+                for gid, v in povzetek["guild"].items()
+            ]), use_container_width=True, hide_index=True)
 
         st.subheader("📅 Roki v naslednjih 7 dneh")
         upcoming = get_data("""
@@ -130,10 +182,11 @@ elif menu == "📝 Pregled in Urejanje":
         with st.expander("🗑️ Izbriši smer (POZOR!)"):
             if not df_prog.empty:
                 st.warning("⚠️ OPOZORILO: Če izbrišeš smer, se izbrišejo VSI letniki, predmeti, gradiva in roki te smeri!")
-                prog_del = st.selectbox("Izberi smer za izbris:", df_prog['id'], format_func=lambda x: df_prog[df_prog['id']==x]['Ime Smeri'].values[0])
+                prog_names = labels(df_prog, 'Ime Smeri')
+                prog_del = st.selectbox("Izberi smer za izbris:", df_prog['id'], format_func=prog_names.__getitem__)
                 
                 if st.button("🔴 Dokončno Izbriši Smer"):
-                    delete_program_full(prog_del)
+                    run_write(repository.delete_program, int(prog_del))
                     st.success("Smer in vsi podatki uspešno izbrisani.")
                     st.rerun()
             else:
@@ -152,16 +205,19 @@ elif menu == "📝 Pregled in Urejanje":
             JOIN years y ON sem.year_id = y.id
             JOIN study_programs sp ON y.program_id = sp.id
         """
-        if search: q += f" WHERE s.name LIKE '%{search}%' OR s.acronym LIKE '%{search}%'"
+        where, params = search_clause(search, ["s.name", "s.acronym"])
+        q += where + " ORDER BY s.name"
         
-        df = get_data(q)
+        df, total = get_page(q, params, key="sub")
         st.dataframe(df, use_container_width=True, hide_index=True)
+        st.caption(f"Zadetkov: {total}")
+        sub_names = labels(df, 'Ime') if not df.empty else {}
 
         c1, c2 = st.columns(2)
         with c1.expander("✏️ Uredi predmet"):
             if not df.empty:
-                sid = st.selectbox("Izberi:", df['id'], format_func=lambda x: df[df['id']==x]['Ime'].values[0])
-                curr = get_data(f"SELECT * FROM subjects WHERE id={sid}").iloc[0]
+                sid = st.selectbox("Izberi:", df['id'], format_func=sub_names.__getitem__)
+                curr = get_data("SELECT * FROM subjects WHERE id=?", (int(sid),)).iloc[0]
                 with st.form("ed_sub"):
                     np = st.text_input("Profesor", value=curr['professor'] if curr['professor'] else "")
                     na = st.text_input("Asistenti", value=curr['assistants'] if curr['assistants'] else "")
@@ -172,11 +228,9 @@ elif menu == "📝 Pregled in Urejanje":
         
         with c2.expander("🗑️ Izbriši predmet"):
             if not df.empty:
-                del_id = st.selectbox("Izberi za izbris:", df['id'], key="d_s", format_func=lambda x: df[df['id']==x]['Ime'].values[0])
+                del_id = st.selectbox("Izberi za izbris:", df['id'], key="d_s", format_func=sub_names.__getitem__)
                 if st.button("Izbriši Predmet", type="primary"):
-                    run_query("DELETE FROM materials WHERE subject_id=?", (del_id,))
-                    run_query("DELETE FROM deadlines WHERE subject_id=?", (del_id,))
-                    run_query("DELETE FROM subjects WHERE id=?", (del_id,))
+                    run_write(repository.delete_subject, int(del_id))
                     st.success("Izbrisano."); st.rerun()
 
     # --- TAB 3: GRADIVA (IZBOLJŠANO) ---
@@ -197,13 +251,18 @@ elif menu == "📝 Pregled in Urejanje":
             JOIN years y ON sem.year_id = y.id
             JOIN study_programs sp ON y.program_id = sp.id
         """
+        search_m = st.text_input("🔍 Išči gradivo:", key="s_mat")
+        where, params = search_clause(search_m, ["s.name", "m.description", "m.url"])
+        q_m += where + " ORDER BY m.id DESC"
 
-        df_m = get_data(q_m)
+        df_m, total_m = get_page(q_m, params, key="mat")
         st.dataframe(df_m, use_container_width=True, hide_index=True)
+        st.caption(f"Zadetkov: {total_m}")
         
         with st.expander("🗑️ Izbriši gradivo"):
             if not df_m.empty:
-                mid = st.selectbox("Gradivo:", df_m['id'], format_func=lambda x: f"{df_m[df_m['id']==x]['Opis'].values[0]} ({df_m[df_m['id']==x]['Predmet'].values[0]})")
+                mat_names = dict(zip(df_m['id'], df_m['Opis'].astype(str) + " (" + df_m['Predmet'] + ")"))
+                mid = st.selectbox("Gradivo:", df_m['id'], format_func=mat_names.__getitem__)
                 if st.button("Izbriši Gradivo"):
                     run_query("DELETE FROM materials WHERE id=?", (mid,))
                     st.success("Izbrisano."); st.rerun()
@@ -217,22 +276,28 @@ elif menu == "📝 Pregled in Urejanje":
 
         q_r = "SELECT d.id, s.name as 'Predmet', d.deadline_type as 'Tip', d.date_time as 'Datum'"
         if has_guild_d: q_r += ", CASE WHEN d.guild_id IS NULL THEN '🌍 Globalno' ELSE '🔒 Zasebno' END as 'Vidnost'"
-        q_r += " FROM deadlines d JOIN subjects s ON d.subject_id = s.id ORDER BY d.date_time DESC"
+        q_r += " FROM deadlines d JOIN subjects s ON d.subject_id = s.id"
+        search_r = st.text_input("🔍 Išči rok:", key="s_rok")
+        where, params = search_clause(search_r, ["s.name", "d.deadline_type", "d.date_time"])
+        q_r += where + " ORDER BY d.date_time DESC"
+
+        df_r, total_r = get_page(q_r, params, key="rok")
 
-        df_r = get_data(q_r)
+        # Pretečene roke izračunamo naenkrat za cel stolpec (brez strptime po vrsticah)
+        expired = pd.to_datetime(df_r['Datum'], format="%Y-%m-%d", errors='coerce') < pd.Timestamp(datetime.now().date()) if not df_r.empty else pd.Series(dtype=bool)
 
-        def style_expired(row):
-            try:
-                if datetime.strptime(row['Datum'], "%Y-%m-%d").date() < datetime.now().date():
-                    return ['color: #ff4b4b; font-weight: bold'] * len(row)
-            except: pass
-            return [''] * len(row)
+        def style_expired(data):
+            styles = pd.DataFrame('', index=data.index, columns=data.columns)
+            styles.loc[expired.values] = 'color: #ff4b4b; font-weight: bold'
+            return styles
 
-        st.dataframe(df_r.style.apply(style_expired, axis=1), use_container_width=True, hide_index=True)
+        st.dataframe(df_r.style.apply(style_expired, axis=None), use_container_width=True, hide_index=True)
+        st.caption(f"Zadetkov: {total_r}")
 
         with st.expander("🗑️ Izbriši rok"):
             if not df_r.empty:
-                rid = st.selectbox("Rok:", df_r['id'], format_func=lambda x: f"{df_r[df_r['id']==x]['Predmet'].values[0]} ({df_r[df_r['id']==x]['Datum'].values[0]})")
+                rok_names = dict(zip(df_r['id'], df_r['Predmet'] + " (" + df_r['Datum'].astype(str) + ")"))
+                rid = st.selectbox("Rok:", df_r['id'], format_func=rok_names.__getitem__)
                 if st.button("Izbriši Rok"):
                     run_query("DELETE FROM deadlines WHERE id=?", (rid,))
                     st.success("Izbrisano."); st.rerun()
@@ -252,50 +317,44 @@ elif menu == "➕ Dodajanje Podatkov":
                 if ime:
                     try:
                         with sqlite3.connect(DB_FILE) as conn:
-                            cur = conn.cursor()
-                            cur.execute("INSERT INTO study_programs (name) VALUES (?)", (ime,))
-                            pid = cur.lastrowid
-                            for i in range(1, st_let + 1):
-                                cur.execute("INSERT INTO years (program_id, number) VALUES (?, ?)", (pid, i))
-                                yid = cur.lastrowid
-                                cur.execute("INSERT INTO semesters (year_id, number) VALUES (?, ?)", (yid, 1))
-                                cur.execute("INSERT INTO semesters (year_id, number) VALUES (?, ?)", (yid, 2))
-                            conn.commit()
+                            repository.create_program(conn, ime, int(st_let))
                         st.success(f"Smer {ime} ustvarjena!")
                     except: st.error("Napaka ali smer že obstaja.")
 
     elif tip == "Predmet":
-        smeri = get_data("SELECT id, name FROM study_programs")
+        smeri = get_data(repository.SQL_PROGRAMS)
         if smeri.empty: st.error("Ni smeri.")
         else:
-            sid = st.selectbox("Smer:", smeri['id'], format_func=lambda x: smeri[smeri['id']==x]['name'].values[0])
-            letniki = get_data("SELECT id, number FROM years WHERE program_id=?", (sid,))
+            smer_names = labels(smeri, 'name')
+            sid = st.selectbox("Smer:", smeri['id'], format_func=smer_names.__getitem__)
+            letniki = get_data(repository.SQL_YEARS, (int(sid),))
             if not letniki.empty:
-                lid = st.selectbox("Letnik:", letniki['id'], format_func=lambda x: str(letniki[letniki['id']==x]['number'].values[0]))
-                sems = get_data("SELECT id, number FROM semesters WHERE year_id=?", (lid,))
+                letnik_names = labels(letniki, 'number')
+                lid = st.selectbox("Letnik:", letniki['id'], format_func=lambda x: str(letnik_names[x]))
+                sems = get_data(repository.SQL_SEMESTERS, (int(lid),))
                 if not sems.empty:
-                    sem_id = st.selectbox("Semester:", sems['id'], format_func=lambda x: "Zimski" if sems[sems['id']==x]['number'].values[0]==1 else "Poletni")
+                    sem_names = labels(sems, 'number')
+                    sem_id = st.selectbox("Semester:", sems['id'], format_func=lambda x: "Zimski" if sem_names[x]==1 else "Poletni")
                     with st.form("add_sub"):
                         ime = st.text_input("Ime")
                         krat = st.text_input("Kratica")
                         prof = st.text_input("Profesor")
                         ects = st.number_input("ECTS", value=6)
                         if st.form_submit_button("Dodaj"):
-                            run_query("INSERT INTO subjects (semester_id, name, acronym, professor, ects) VALUES (?,?,?,?,?)", (sem_id, ime, krat, prof, ects))
+                            run_query(repository.SQL_ADD_SUBJECT, (int(sem_id), ime, krat, prof, ects))
                             st.success("Dodano!")
             else: st.warning("Ta smer nima letnikov.")
 
     elif tip in ["Gradivo", "Rok"]:
-        preds = get_data("SELECT id, name FROM subjects ORDER BY name")
-        if preds.empty: st.error("Ni predmetov.")
+        pid = search_picker("Predmet:", "SELECT id, name, acronym FROM subjects", ["name", "acronym"], "name", key="add_pred")
+        if pid is None: st.error("Ni predmetov.")
         else:
-            pid = st.selectbox("Predmet:", preds['id'], format_func=lambda x: preds[preds['id']==x]['name'].values[0])
             if tip == "Gradivo":
                 with st.form("add_m"):
                     url = st.text_input("URL")
                     opis = st.text_input("Opis")
                     if st.form_submit_button("Dodaj"):
-                        run_query("INSERT INTO materials (subject_id, url, description, type) VALUES (?,?,?,?)", (pid, url, opis, "Gradivo"))
+                        run_query(repository.SQL_ADD_MATERIAL, (int(pid), None, url, opis, "Gradivo"))
                         st.success("Dodano!")
             else:
                 with st.form("add_r"):
@@ -303,5 +362,94 @@ elif menu == "➕ Dodajanje Podatkov":
                     dat = st.date_input("Datum")
                     opis = st.text_input("Opis")
                     if st.form_submit_button("Dodaj"):
-                        run_query("INSERT INTO deadlines (subject_id, deadline_type, date_time, description) VALUES (?,?,?,?)", (pid, rtip, dat.strftime("%Y-%m-%d"), opis))
-                        st.success("Dodano!")
\ No newline at end of file
+                        run_query(repository.SQL_ADD_DEADLINE, (int(pid), None, rtip, dat.strftime("%Y-%m-%d"), opis))
+                        st.success("Dodano!")
+
+# ==========================================
+# 4. VARNOSTNE KOPIJE
+# ==========================================
+elif menu == "💾 Varnostne Kopije":
+    st.title("💾 Varnostne Kopije")
+    st.caption(f"Kopije se ustvarjajo samodejno vsakih {backup.BACKUP_INTERVAL_HOURS:g} ur, hrani se jih zadnjih {backup.BACKUP_KEEP}. Mapa: `{backup.BACKUP_DIR}`")
+
+    c1, c2 = st.columns(2)
+    if c1.button("📸 Ustvari kopijo zdaj"):
+        try:
+            path = backup.create_snapshot(DB_FILE)
+            st.success(f"Ustvarjeno: {os.path.basename(path)}")
+        except Exception as e:
+            st.error(f"Napaka: {e}")
+    if c2.button("⬇️ Pripravi trenutno stanje za prenos"):
+        # Kopija se naredi skozi backup API, zato je konsistentna tudi med pisanjem bota
+        try:
+            path = backup.create_snapshot(DB_FILE, label="prenos")
+            st.session_state['trenutno_stanje'] = st.session_state['trenutno_prenos'] = path
+        except Exception as e:
+            st.error(f"Napaka: {e}")
+    if 'trenutno_stanje' in st.session_state:
+        with c2:
+            offer_download(st.session_state['trenutno_stanje'], "application/x-sqlite3", "trenutno_prenos")
+
+    kopije = backup.list_snapshots()
+    if not kopije:
+        st.info("Ni shranjenih kopij.")
+    else:
+        st.dataframe(pd.DataFrame([
+            {"Ime": name, "Velikost (KB)": size // 1024, "Čas": mtime.strftime("%d. %m. %Y %H:%M")}
+            for name, size, mtime in kopije
+        ]), use_container_width=True, hide_index=True)
+
+        izbrana = st.selectbox("Kopija:", [name for name, _, _ in kopije])
+        try:
+            offer_download(backup.snapshot_path(izbrana), "application/x-sqlite3", "kopija_prenos", "📦 Pripravi izbrano kopijo")
+        except FileNotFoundError:
+            st.warning(f"Kopija `{izbrana}` ne obstaja več (morda jo je pobrisala rotacija).")
+
+        with st.expander("♻️ Obnovi bazo iz kopije (POZOR!)"):
+            st.warning("⚠️ Trenutni podatki bodo zamenjani. Pred obnovo se samodejno shrani varnostna kopija.")
+            if st.button("🔴 Obnovi"):
+                try:
+                    safety = backup.restore_snapshot(izbrana, DB_FILE)
+                    repository.init_schema(DB_FILE) # Migracije, če je kopija starejša od trenutne sheme
+                    st.success(f"Obnovljeno. Prejšnje stanje: {os.path.basename(safety)}")
+                except Exception as e:
+                    st.error(f"Napaka: {e}")
+
+# ==========================================
+# 5. IZVOZ
+# ==========================================
+elif menu == "📤 Izvoz":
+    st.title("📤 Izvoz Podatkov")
+    st.caption(f"Izvoz se bere po {export.EXPORT_CHUNK} vrstic naenkrat in sproti zapisuje na disk (`{export.EXPORT_DIR}`). "
+               f"Prenos v brskalnik pa celotno datoteko naloži v pomnilnik, zato je na voljo le do {DOWNLOAD_MAX_MB} MB.")
+
+    c1, c2, c3 = st.columns(3)
+    tabela = c1.selectbox("Podatki:", list(export.TABLES))
+    fmt = c2.selectbox("Format:", list(export.FORMATS))
+    obseg = c3.selectbox("Filter:", ["Vse", "Smer", "Strežnik"])
+
+    program_id = guild_id = None
+    if obseg == "Smer":
+        smeri = get_data("SELECT id, name FROM study_programs ORDER BY name")
+        if smeri.empty:
+            st.info("Ni smeri.")
+        else:
+            program_id = int(st.selectbox("Smer:", smeri['id'], format_func=labels(smeri, 'name').__getitem__))
+    elif obseg == "Strežnik":
+        strezniki = get_data("SELECT guild_id FROM server_config ORDER BY guild_id")
+        if strezniki.empty:
+            st.info("Ni nastavljenih strežnikov.")
+        else:
+            guild_id = int(st.selectbox("Strežnik (guild_id):", strezniki['guild_id']))
+            st.caption("Gradiva in roki: lokalni za strežnik + globalni. Predmeti: smer, nastavljena na strežniku.")
+
+    if st.button("📦 Pripravi izvoz"):
+        try:
+            path, vrstic = export.export_to_file(tabela, fmt, guild_id, program_id, db_path=DB_FILE)
+            st.session_state['export_path'] = st.session_state['izvoz_prenos'] = path
+            st.success(f"Izvoženih {vrstic} vrstic.")
+        except Exception as e:
+            st.error(f"Napaka: {e}")
+    path = st.session_state.get('export_path')
+    if path:
+        offer_download(path, "text/csv" if path.endswith(".csv") else "application/x-ndjson", "izvoz_prenos")
@@ -0,0 +1,89 @@
+import os
+import sqlite3
+from datetime import datetime
+
+# --- VARNOSTNE KOPIJE (SQLITE ONLINE BACKUP API) ---
+# Kopira se po majhnih korakih (BACKUP_PAGES strani naenkrat, vmes kratek premor),
+# tako da bot in admin panel med kopiranjem normalno pišeta v bazo.
+DATABASE_NAME = os.getenv('DATABASE_PATH', 'studij.db')
+BACKUP_DIR = os.getenv('BACKUP_DIR', os.path.join(os.path.dirname(os.path.abspath(DATABASE_NAME)), 'backups'))
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '28'))
+BACKUP_INTERVAL_HOURS = float(os.getenv('BACKUP_INTERVAL_HOURS', '6'))
+BACKUP_PAGES = 64
+BACKUP_SLEEP = 0.005
+
+SNAPSHOT_PREFIX = "studij-"
+SNAPSHOT_SUFFIX = ".db"
+
+
+def copy_database(src_path, dest_path, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP):
+    """Konsistentna kopija baze `src_path` v `dest_path` (deluje tudi med pisanjem)."""
+    src = sqlite3.connect(src_path)
+    dest = sqlite3.connect(dest_path)
+    try:
+        src.backup(dest, pages=pages, sleep=sleep)
+        result = dest.execute("PRAGMA quick_check").fetchone()[0]
+        if result != "ok":
+            raise sqlite3.DatabaseError(f"Kopija ni veljavna: {result}")
+    finally:
+        dest.close()
+        src.close()
+
+
+def list_snapshots(backup_dir=BACKUP_DIR):
+    """Seznam (ime, velikost v bajtih, čas) vseh kopij, najnovejša prva."""
+    if not os.path.isdir(backup_dir):
+        return []
+    out = []
+    for name in os.listdir(backup_dir):
+        if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX):
+            st = os.stat(os.path.join(backup_dir, name))
+            out.append((name, st.st_size, datetime.fromtimestamp(st.st_mtime)))
+    return sorted(out, key=lambda s: s[0], reverse=True)
+
+
+def rotate(keep=BACKUP_KEEP, backup_dir=BACKUP_DIR):
+    """Izbriše najstarejše kopije, da jih ostane največ `keep`; vrne izbrisana imena."""
+    removed = []
+    for name, _, _ in list_snapshots(backup_dir)[keep:]:
+        os.remove(os.path.join(backup_dir, name))
+        removed.append(name)
+    return removed
+
+
+def create_snapshot(db_path=DATABASE_NAME, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP, label=""):
+    """Ustvari novo kopijo v `backup_dir`, pobriše stare in vrne pot do nove kopije."""
+    os.makedirs(backup_dir, exist_ok=True)
+    # Mikrosekunde: dve kopiji v isti sekundi (npr. ročna in samodejna) se ne smeta prepisati
+    name = SNAPSHOT_PREFIX + datetime.now().strftime("%Y%m%d-%H%M%S-%f") + (f"-{label}" if label else "") + SNAPSHOT_SUFFIX
+    path = os.path.join(backup_dir, name)
+    # Pišemo v začasno datoteko in jo preimenujemo šele, ko je kopija celovita
+    tmp_path = path + ".tmp"
+    try:
+        copy_database(db_path, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    rotate(keep, backup_dir)
+    return path
+
+
+def snapshot_path(name, backup_dir=BACKUP_DIR):
+    """Varna pot do kopije z imenom `name` (brez poti izven backup_dir)."""
+    if os.path.basename(name) != name or not name.startswith(SNAPSHOT_PREFIX) or not name.endswith(SNAPSHOT_SUFFIX):
+        raise ValueError(f"Neveljavno ime kopije: {name}")
+    path = os.path.join(backup_dir, name)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(name)
+    return path
+
+
+def restore_snapshot(name, db_path=DATABASE_NAME, backup_dir=BACKUP_DIR):
+    """Obnovi bazo iz kopije `name`; pred tem shrani trenutno stanje kot varnostno kopijo."""
+    path = snapshot_path(name, backup_dir)
+    # keep + 1: rotacija ne sme pobrisati kopije, iz katere ravno obnavljamo
+    safety = create_snapshot(db_path, backup_dir, keep=BACKUP_KEEP + 1, label="pred-obnovo")
+    # Obnova gre prav tako skozi backup API, zato ostale povezave ne vidijo napol zapisane baze
+    copy_database(path, db_path)
+    return safety
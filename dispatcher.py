@@ -0,0 +1,347 @@
+import asyncio
+import heapq
+import itertools
+import time
+import traceback
+from collections import deque
+
+# --- PRIORITETE (nižja številka = prej na vrsti) ---
+PRIORITY_INTERACTION = 0  # Odgovori na interakcije (Discord zahteva odgovor v 3 s)
+PRIORITY_COMMAND = 1      # Odgovori na ukaze
+PRIORITY_REMINDER = 2     # Opomniki iz check_deadlines
+
+# Discord dovoli največ 10 embedov in 6000 znakov (vsi embedi skupaj) v enem sporočilu
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+
+class TokenBucket:
+    """Vedro žetonov: `rate` žetonov na sekundo, največ `capacity` naenkrat."""
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Koliko sekund je treba počakati na naslednji žeton (0 = takoj)."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Item:
+    __slots__ = ("priority", "seq", "key", "target", "kwargs", "coalescable", "future", "enqueued")
+
+    def __init__(self, priority, seq, key, target, kwargs, coalescable):
+        self.priority = priority
+        self.seq = seq
+        self.key = key
+        self.target = target
+        self.kwargs = kwargs
+        self.coalescable = coalescable
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+def _channel_id(destination):
+    # ctx in Message imata .channel, TextChannel je kanal sam
+    return getattr(destination, "channel", destination).id
+
+
+def percentile(values, pct):
+    """Percentil brez interpolacije (uporabljajo ga tudi looplag in loadtest)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class MessageDispatcher:
+    """Centralna vrsta za odhodna sporočila z omejevanjem hitrosti.
+
+    Vsak kanal ima svojo prioritetno vrsto; kanali, ki imajo prost žeton, so v
+    skupni kopici "pripravljenih" (po prioriteti in vrstnem redu čela), ostali pa
+    v kopici "spečih" do trenutka, ko dobijo žeton. Izbira naslednjega sporočila je
+    tako O(log n) ne glede na dolžino vrste. Pošiljanje omejujeta vedro na kanal in
+    globalno vedro, tako da se izbruhi zgladijo namesto da bi dobili 429. Več
+    čakajočih opomnikov za isti kanal se združi v eno sporočilo. V vsak kanal je hkrati
+    na poti največ eno sporočilo, zato pridejo v vrstnem redu, v katerem so bila oddana.
+    """
+
+    def __init__(self, channel_rate=1.0, channel_burst=5, global_rate=45.0, global_burst=45, max_in_flight=8):
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._interactions = [] # Odgovori na interakcije (brez kanala in omejitev)
+        self._channels = {}     # kanal -> kopica _Item
+        self._ready = []        # (prioriteta, seq, kanal) za čelo kanala s prostim žetonom; zastareli vnosi se preskočijo
+        self._sleeping = []     # (čas naslednjega žetona, kanal)
+        self._asleep = set()
+        self._busy = set()      # Kanali, v katere se sporočilo še pošilja; nazaj v vrsto pridejo po koncu
+        self._channel_rate = channel_rate
+        self._channel_burst = channel_burst
+        self._channel_buckets = {}
+        self._global = TokenBucket(global_rate, global_burst)
+        # Omejitev velja samo za pošiljanje v kanale; odgovori na interakcije imajo rok 3 s
+        # in ne smejo čakati za počasnimi nalaganji datotek ali 429 v kanalih
+        self._max_in_flight = max_in_flight
+        self._channel_in_flight = 0
+        self._worker = None
+        self._waits = deque(maxlen=1000)
+        self._queued = {PRIORITY_INTERACTION: 0, PRIORITY_COMMAND: 0, PRIORITY_REMINDER: 0}
+        self.in_flight = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    # --- ŽIVLJENJSKI CIKEL ---
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run(), name="message-dispatcher")
+            self._worker.add_done_callback(self._worker_done)
+
+    async def stop(self):
+        if self._worker is not None:
+            worker, self._worker = self._worker, None
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._fail_pending(asyncio.CancelledError)
+
+    def _worker_done(self, task):
+        # Na futurje čakajo ukazi in check_deadlines; brez delavca bi čakali večno
+        if task.cancelled() or task is not self._worker:
+            return
+        e = task.exception()
+        print(f"⚠️ Dispečer sporočil se je sesul, zaganjam ga znova: {e!r}")
+        traceback.print_exception(type(e), e, e.__traceback__)
+        self._fail_pending(e)
+        self.start()
+
+    def _fail_pending(self, error):
+        """Zavrne vsa čakajoča sporočila (ta, ki so že na poti, se končajo sama)."""
+        pending = self._interactions + [item for queue in self._channels.values() for item in queue]
+        self._interactions.clear()
+        self._channels.clear()
+        self._ready.clear()
+        self._sleeping.clear()
+        self._asleep.clear()
+        for priority in self._queued:
+            self._queued[priority] = 0
+        for item in pending:
+            if not item.future.done():
+                if error is asyncio.CancelledError:
+                    item.future.cancel()
+                else:
+                    item.future.set_exception(error)
+
+    # --- JAVNI VMESNIK ---
+    def send(self, destination, content=None, *, priority=PRIORITY_COMMAND, **kwargs):
+        """Doda `destination.send(...)` v vrsto in vrne future s poslanim sporočilom."""
+        if content is not None:
+            kwargs["content"] = content
+        # Združujemo lahko le "gole" opomnike z enim embedom
+        coalescable = priority == PRIORITY_REMINDER and set(kwargs) == {"embed"}
+        return self._submit(priority, _channel_id(destination), destination.send, kwargs, coalescable)
+
+    def respond(self, interaction, content=None, *, edit=False, **kwargs):
+        """Doda odgovor na interakcijo (send_message ali edit_message) na začetek vrste."""
+        if content is not None:
+            kwargs["content"] = content
+        target = interaction.response.edit_message if edit else interaction.response.send_message
+        # Odgovori na interakcije ne štejejo v omejitev kanala
+        return self._submit(PRIORITY_INTERACTION, None, target, kwargs, False)
+
+    def edit(self, interaction, content=None, **kwargs):
+        """Bližnjica za `respond(..., edit=True)`."""
+        return self.respond(interaction, content, edit=True, **kwargs)
+
+    def stats(self):
+        waits = list(self._waits)
+        return {
+            "queue_depth": sum(self._queued.values()),
+            "queue_interaction": self._queued[PRIORITY_INTERACTION],
+            "queue_command": self._queued[PRIORITY_COMMAND],
+            "queue_reminder": self._queued[PRIORITY_REMINDER],
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "wait_avg_ms": (sum(waits) / len(waits) * 1000) if waits else 0.0,
+            "wait_p50_ms": percentile(waits, 50) * 1000,
+            "wait_p99_ms": percentile(waits, 99) * 1000,
+            "wait_max_ms": max(waits) * 1000 if waits else 0.0,
+        }
+
+    # --- NOTRANJOST ---
+    def _submit(self, priority, key, target, kwargs, coalescable):
+        item = _Item(priority, next(self._seq), key, target, kwargs, coalescable)
+        # Napake se vedno zabeležijo v _deliver; brez tega bi asyncio opozarjal
+        # na "Future exception was never retrieved" pri pošiljanju brez await.
+        item.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._queued[priority] = self._queued.get(priority, 0) + 1
+        if key is None:
+            heapq.heappush(self._interactions, item)
+        else:
+            queue = self._channels.setdefault(key, [])
+            heapq.heappush(queue, item)
+            # Novo čelo kanala; speči ali zaseden kanal pride med pripravljene sam
+            if queue[0] is item and key not in self._asleep and key not in self._busy:
+                heapq.heappush(self._ready, (item.priority, item.seq, key))
+        self._wakeup.set()
+        return item.future
+
+    def _bucket(self, key):
+        bucket = self._channel_buckets.get(key)
+        if bucket is None:
+            bucket = self._channel_buckets[key] = TokenBucket(self._channel_rate, self._channel_burst)
+        return bucket
+
+    def _schedule(self, key, now):
+        """Po spremembi kanala ga postavi med pripravljene ali speče (prazen kanal se pozabi)."""
+        queue = self._channels.get(key)
+        if not queue:
+            self._channels.pop(key, None)
+            return
+        wait = self._bucket(key).delay(now)
+        if wait == 0.0:
+            heapq.heappush(self._ready, (queue[0].priority, queue[0].seq, key))
+        else:
+            heapq.heappush(self._sleeping, (now + wait, key))
+            self._asleep.add(key)
+
+    def _pick(self, now):
+        """Vrne prvi element po prioriteti, katerega kanal ima prost žeton, ali najkrajši čas čakanja."""
+        while self._sleeping and self._sleeping[0][0] <= now:
+            _, key = heapq.heappop(self._sleeping)
+            self._asleep.discard(key)
+            self._schedule(key, now)
+        while self._ready:
+            _, seq, key = self._ready[0]
+            queue = self._channels.get(key)
+            if not queue or queue[0].seq != seq or key in self._asleep or key in self._busy:
+                heapq.heappop(self._ready) # Zastarel vnos (čelo kanala se je medtem zamenjalo)
+                continue
+            wait = self._bucket(key).delay(now)
+            if wait == 0.0:
+                break
+            # Kanal je bil prazen in je svoje žetone porabil; počaka na naslednjega
+            heapq.heappop(self._ready)
+            heapq.heappush(self._sleeping, (now + wait, key))
+            self._asleep.add(key)
+        interaction = self._interactions[0] if self._interactions else None
+        channel_item = self._channels[self._ready[0][2]][0] if self._ready else None
+        if interaction is not None and (channel_item is None or interaction < channel_item):
+            return interaction, 0.0
+        if channel_item is not None:
+            return channel_item, 0.0
+        return None, (self._sleeping[0][0] - now) if self._sleeping else None
+
+    def _take(self, item):
+        self._queued[item.priority] -= 1
+        if item.key is None:
+            heapq.heappop(self._interactions)
+            return [item]
+        heapq.heappop(self._ready)
+        queue = self._channels[item.key]
+        heapq.heappop(queue)
+        batch = [item]
+        if item.coalescable:
+            # Združujemo le zaporedne opomnike; ob prvem, ki ne gre zraven, se ustavimo,
+            # sicer bi strani povzetka ("Stran i/n") prišle v napačnem vrstnem redu
+            chars = len(item.kwargs["embed"])
+            while queue and len(batch) < MAX_EMBEDS_PER_MESSAGE:
+                other = queue[0]
+                if not other.coalescable:
+                    break
+                size = len(other.kwargs["embed"])
+                if chars + size > MAX_EMBED_CHARS_PER_MESSAGE:
+                    break
+                heapq.heappop(queue)
+                self._queued[other.priority] -= 1
+                batch.append(other)
+                chars += size
+        return batch
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            item, wait = self._pick(now)
+            if item is None:
+                # Prazna vrsta ali vsi kanali brez žetona; počakaj na žeton ali na novo sporočilo
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if item.key is not None:
+                if self._channel_in_flight >= self._max_in_flight:
+                    # Vsa mesta so zasedena; zbudi nas konec pošiljanja ali nova interakcija
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                # Odgovori na interakcije ne štejejo v globalno omejitev Discorda
+                global_wait = self._global.delay(now)
+                if global_wait:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=global_wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+            batch = self._take(item)
+            if item.key is not None:
+                self._global.consume(now)
+                self._bucket(item.key).consume(now)
+                # Naslednje sporočilo kanala gre šele, ko se to konča (_deliver)
+                self._busy.add(item.key)
+                self._channel_in_flight += 1
+            for queued in batch:
+                self._waits.append(now - queued.enqueued)
+            self.in_flight += 1
+            asyncio.create_task(self._deliver(batch))
+
+    async def _deliver(self, batch):
+        first = batch[0]
+        try:
+            if len(batch) > 1:
+                result = await first.target(embeds=[queued.kwargs["embed"] for queued in batch])
+                self.coalesced += len(batch) - 1
+            else:
+                result = await first.target(**first.kwargs)
+            self.sent += 1
+            for queued in batch:
+                if not queued.future.done():
+                    queued.future.set_result(result)
+        except Exception as e:
+            self.failed += 1
+            print(f"⚠️ Pošiljanje sporočila ni uspelo: {e}")
+            for queued in batch:
+                if not queued.future.done():
+                    queued.future.set_exception(e)
+        finally:
+            self.in_flight -= 1
+            if first.key is not None:
+                self._channel_in_flight -= 1
+                self._busy.discard(first.key)
+                self._schedule(first.key, time.monotonic())
+                self._wakeup.set()
@@ -0,0 +1,160 @@
+import csv
+import json
+import os
+import pathlib
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+
+# --- IZVOZ PODATKOV (CSV / JSONL) ---
+# Vrstice se berejo s kurzorjem po EXPORT_CHUNK naenkrat (fetchmany) in se sproti
+# zapisujejo v datoteko, zato je poraba pomnilnika enaka ne glede na velikost tabele.
+# Hkrati teče največ EXPORT_CONCURRENCY izvozov na proces (bot in admin panel vsak zase).
+DATABASE_NAME = os.getenv('DATABASE_PATH', 'studij.db')
+EXPORT_DIR = os.getenv('EXPORT_DIR', os.path.join(os.path.dirname(os.path.abspath(DATABASE_NAME)), 'exports'))
+EXPORT_CHUNK = 500
+EXPORT_CONCURRENCY = int(os.getenv('EXPORT_CONCURRENCY', '2'))
+EXPORT_KEEP = 20
+
+FORMATS = ("csv", "jsonl")
+
+_CATALOG = """
+    JOIN semesters sem ON s.semester_id = sem.id
+    JOIN years y ON sem.year_id = y.id
+    JOIN study_programs sp ON y.program_id = sp.id
+"""
+
+# ime -> (stolpci, poizvedba, alias tabele z guild_id ali None)
+TABLES = {
+    "gradiva": (
+        ("id", "smer", "letnik", "semester", "predmet", "kratica", "tip", "opis", "url", "guild_id"),
+        "SELECT m.id, sp.name, y.number, sem.number, s.name, s.acronym, m.type, m.description, m.url, m.guild_id "
+        "FROM materials m JOIN subjects s ON m.subject_id = s.id" + _CATALOG,
+        "m",
+    ),
+    "roki": (
+        ("id", "smer", "letnik", "semester", "predmet", "kratica", "tip", "datum", "opis", "guild_id"),
+        "SELECT d.id, sp.name, y.number, sem.number, s.name, s.acronym, d.deadline_type, d.date_time, d.description, d.guild_id "
+        "FROM deadlines d JOIN subjects s ON d.subject_id = s.id" + _CATALOG,
+        "d",
+    ),
+    "predmeti": (
+        ("id", "smer", "letnik", "semester", "predmet", "kratica", "ects", "profesor", "asistenti"),
+        "SELECT s.id, sp.name, y.number, sem.number, s.name, s.acronym, s.ects, s.professor, s.assistants "
+        "FROM subjects s" + _CATALOG,
+        None,
+    ),
+}
+
+_slots = threading.BoundedSemaphore(EXPORT_CONCURRENCY)
+
+
+def query(table, guild_id=None, program_id=None):
+    """Vrne (stolpci, sql, parametri) za izvoz tabele z izbirnim filtrom po strežniku ali smeri."""
+    if table not in TABLES:
+        raise ValueError(f"Neznana tabela '{table}' (na voljo: {', '.join(TABLES)}).")
+    columns, sql, alias = TABLES[table]
+    where, params = [], []
+    if guild_id is not None:
+        if alias:
+            # Isto pravilo vidnosti kot v botu: lokalni podatki strežnika + globalni
+            where.append(f"({alias}.guild_id = ? OR {alias}.guild_id IS NULL)")
+        else:
+            # Katalog nima guild_id; strežnik pomeni njegovo nastavljeno smer
+            where.append("y.program_id = (SELECT current_program_id FROM server_config WHERE guild_id = ?)")
+        params.append(guild_id)
+    if program_id is not None:
+        where.append("y.program_id = ?")
+        params.append(program_id)
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # Urejanje po primarnem ključu ne potrebuje začasnega sortiranja
+    return columns, f"{sql} ORDER BY {alias or 's'}.id", params
+
+
+def _check_format(fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Neznan format '{fmt}' (na voljo: {', '.join(FORMATS)}).")
+
+
+def iter_rows(conn, table, guild_id=None, program_id=None, chunk=EXPORT_CHUNK):
+    """Generator vrstic; v pomnilniku je naenkrat največ `chunk` vrstic."""
+    _, sql, params = query(table, guild_id, program_id)
+    cursor = conn.execute(sql, params)
+    try:
+        while rows := cursor.fetchmany(chunk):
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def write(conn, table, fmt, f, guild_id=None, program_id=None, chunk=EXPORT_CHUNK):
+    """Zapiše izvoz v odprto besedilno datoteko `f`; vrne število vrstic."""
+    _check_format(fmt)
+    columns = query(table)[0]
+    rows = iter_rows(conn, table, guild_id, program_id, chunk)
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def export_name(table, fmt, guild_id=None, program_id=None):
+    scope = f"-streznik{guild_id}" if guild_id is not None else ""
+    scope += f"-smer{program_id}" if program_id is not None else ""
+    # Mikrosekunde: enaka izvoza v isti sekundi (npr. iz bota in admin panela) se ne smeta prepisati
+    return f"izvoz-{table}{scope}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.{fmt}"
+
+
+def export_to_file(table, fmt, guild_id=None, program_id=None, db_path=DATABASE_NAME, out_dir=EXPORT_DIR, keep=EXPORT_KEEP, wait=30):
+    """Izvozi tabelo v `out_dir`; vrne (pot, število vrstic). Blokira, zato v botu prek to_thread."""
+    if not _slots.acquire(timeout=wait):
+        raise RuntimeError("Preveč sočasnih izvozov, poskusi znova čez nekaj trenutkov.")
+    try:
+        # Neveljavna tabela ali format se javita, preden kaj ustvarimo
+        query(table)
+        _check_format(fmt)
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, export_name(table, fmt, guild_id, program_id))
+        # Samo za branje: izvoz ne more zakleniti baze za pisanje
+        conn = sqlite3.connect(pathlib.Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+        fd, tmp = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                count = write(conn, table, fmt, f, guild_id, program_id)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        finally:
+            conn.close()
+        rotate(keep, out_dir)
+        return path, count
+    finally:
+        _slots.release()
+
+
+def rotate(keep=EXPORT_KEEP, out_dir=EXPORT_DIR):
+    """Obdrži le zadnjih `keep` izvozov."""
+    # Bot in admin panel rotirata vsak zase; datoteko, ki jo je drugi že pobrisal, preskočimo
+    mtimes = {}
+    for name in os.listdir(out_dir):
+        if name.startswith("izvoz-"):
+            try:
+                mtimes[name] = os.path.getmtime(os.path.join(out_dir, name))
+            except FileNotFoundError:
+                pass
+    for name in sorted(mtimes, key=mtimes.get, reverse=True)[keep:]:
+        try:
+            os.remove(os.path.join(out_dir, name))
+        except FileNotFoundError:
+            pass
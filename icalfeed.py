@@ -0,0 +1,162 @@
+import hashlib
+import hmac
+import os
+from datetime import date, datetime, timedelta, timezone
+
+from aiohttp import web
+
+# --- KOLEDAR (iCalendar) ZA STREŽNIK ---
+# GET /koledar/{guild_id}-{podpis}.ics[?semester=ID|trenutni]
+# Podpis (HMAC) prepreči ugibanje koledarjev tujih strežnikov. Izrisan koledar
+# se hrani v pomnilniku skupaj z različico podatkov; različico vzdržujejo prožilci
+# spodaj, zato spremembe iz bota in iz admin panela takoj razveljavijo predpomnilnik.
+FEED_HOST = os.getenv('FEED_HOST', '0.0.0.0')
+FEED_PORT = int(os.getenv('FEED_PORT', '8502'))
+FEED_BASE_URL = os.getenv('FEED_BASE_URL', f'http://localhost:{FEED_PORT}')
+FEED_PAST_DAYS = 180 # Toliko dni stari roki še ostanejo v koledarju
+FEED_MAX_AGE = 300
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS feed_versions (
+        guild_id INTEGER PRIMARY KEY, -- 0 = globalni roki in spremembe predmetov
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+]
+_BUMP = "INSERT INTO feed_versions (guild_id, version) VALUES ({guild}, 1) ON CONFLICT(guild_id) DO UPDATE SET version = version + 1;"
+for _event, _rows in (("INSERT", ("NEW",)), ("DELETE", ("OLD",)), ("UPDATE", ("OLD", "NEW"))):
+    SCHEMA.append(f"""
+    CREATE TRIGGER IF NOT EXISTS feed_deadlines_{_event.lower()} AFTER {_event} ON deadlines BEGIN
+        {" ".join(_BUMP.format(guild=f"COALESCE({row}.guild_id, 0)") for row in _rows)}
+    END""")
+SCHEMA.append(f"""
+    CREATE TRIGGER IF NOT EXISTS feed_subjects_update AFTER UPDATE OF name, acronym, semester_id ON subjects BEGIN
+        {_BUMP.format(guild=0)}
+    END""")
+
+
+def feed_secret(token):
+    """Ključ za podpise; FEED_SECRET ali izpeljan iz žetona bota (stabilen med ponovnimi zagoni)."""
+    secret = os.getenv('FEED_SECRET') or hashlib.sha256(f"koledar:{token}".encode()).hexdigest()
+    return secret.encode()
+
+
+def sign(secret, guild_id):
+    return hmac.new(secret, str(guild_id).encode(), hashlib.sha256).hexdigest()[:20]
+
+
+def feed_url(secret, guild_id, semester=None):
+    url = f"{FEED_BASE_URL.rstrip('/')}/koledar/{guild_id}-{sign(secret, guild_id)}.ics"
+    return f"{url}?semester={semester}" if semester is not None else url
+
+
+# --- IZRIS ---
+def _escape(text):
+    return (text or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\r\n", "\\n").replace("\n", "\\n")
+
+
+def _fold(line):
+    """Vrstice daljše od 75 bajtov se prelomijo (RFC 5545, 3.1)."""
+    data = line.encode()
+    if len(data) <= 75:
+        return line
+    parts, start = [], 0
+    while start < len(data):
+        end = min(start + (75 if not parts else 74), len(data))
+        while end < len(data) and (data[end] & 0xC0) == 0x80: # Ne prelomimo sredi UTF-8 znaka
+            end -= 1
+        parts.append(data[start:end].decode())
+        start = end
+    return "\r\n ".join(parts)
+
+
+def render(rows, name, stamp=None):
+    """Vrstice (id, tip, datum, opis, predmet, kratica) -> besedilo .ics."""
+    stamp = (stamp or datetime.now(timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//UMHelper//Roki//SL", "CALSCALE:GREGORIAN",
+             "METHOD:PUBLISH", f"X-WR-CALNAME:{_escape(name)}", "X-PUBLISHED-TTL:PT1H"]
+    for rok_id, dtype, ddate, desc, subject, acronym in rows:
+        day = date.fromisoformat(ddate)
+        lines += ["BEGIN:VEVENT", f"UID:rok-{rok_id}@umhelper", f"DTSTAMP:{stamp}",
+                  f"DTSTART;VALUE=DATE:{day:%Y%m%d}", f"DTEND;VALUE=DATE:{day + timedelta(days=1):%Y%m%d}",
+                  f"SUMMARY:{_escape(f'{dtype}: {subject}' + (f' ({acronym})' if acronym else ''))}"]
+        if desc: lines.append(f"DESCRIPTION:{_escape(desc)}")
+        lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(_fold(line) for line in lines) + "\r\n").encode()
+
+
+class _Feed:
+    __slots__ = ("state", "etag", "body")
+
+    def __init__(self, state, etag, body):
+        self.state = state
+        self.etag = etag
+        self.body = body
+
+
+class FeedServer:
+    """Majhen HTTP strežnik v procesu bota, ki servira .ics z ETag/304."""
+
+    def __init__(self, repo, secret):
+        self.repo = repo
+        self.secret = secret
+        self._cache = {} # (guild_id, semester_id ali None) -> _Feed
+        self._runner = None
+        self.hits = 0
+        self.not_modified = 0
+        self.renders = 0
+
+    async def start(self, host=FEED_HOST, port=FEED_PORT):
+        app = web.Application()
+        app.router.add_get("/koledar/{feed}.ics", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def invalidate(self, guild_id=None):
+        if guild_id is None:
+            self._cache.clear()
+        else:
+            for key in [k for k in self._cache if k[0] == guild_id]:
+                del self._cache[key]
+
+    async def handle(self, request):
+        guild_part, _, signature = request.match_info["feed"].partition("-")
+        if not guild_part.isdigit() or not hmac.compare_digest(signature, sign(self.secret, int(guild_part))):
+            raise web.HTTPNotFound()
+        guild_id = int(guild_part)
+
+        await self.repo.sync() # Po obnovi iz admin panela bi sicer stregli star koledar
+        state = await self.repo.feed_state(guild_id)
+        if state is None:
+            raise web.HTTPNotFound()
+        semester = request.query.get("semester")
+        if semester == "trenutni":
+            semester_id = state.semester_id
+        elif semester is None or semester.isdigit():
+            semester_id = int(semester) if semester else None
+        else:
+            raise web.HTTPBadRequest(text="semester mora biti ID ali 'trenutni'")
+
+        key = (guild_id, semester_id)
+        feed = self._cache.get(key)
+        if feed is None or feed.state != state:
+            since = (date.today() - timedelta(days=FEED_PAST_DAYS)).isoformat()
+            rows = await self.repo.feed_deadlines(guild_id, state.program_id, semester_id, since)
+            body = render(rows, f"Roki – {state.program_name}")
+            feed = self._cache[key] = _Feed(state, f'"{hashlib.sha1(body).hexdigest()}"', body)
+            self.renders += 1
+
+        headers = {"ETag": feed.etag, "Cache-Control": f"max-age={FEED_MAX_AGE}"}
+        if feed.etag in request.headers.get("If-None-Match", ""):
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+        self.hits += 1
+        return web.Response(body=feed.body, content_type="text/calendar", charset="utf-8", headers=headers)
@@ -0,0 +1,387 @@
+"""Obremenitveni test bota z lokalnim nadomestkom za Discord.
+
+Pravi `bot` iz main.py se prijavi v lokalni aiohttp strežnik, ki posnema
+Discord REST API (sporočila, odgovori na interakcije, omejitve hitrosti).
+Dogodke, ki bi sicer prišli po gatewayu (MESSAGE_CREATE, INTERACTION_CREATE),
+pošiljamo neposredno v ConnectionState bota, tako da tečejo skozi iste
+ukaze, View-je in callbacke kot v produkciji.
+
+Primeri:
+    python loadtest.py --scenario arhiv --users 2000 --concurrency 200
+    python loadtest.py --scenario dodaj_rok --users 500 --latency-ms 50
+    python loadtest.py --scenario opomniki --guilds 300 --rate-limit
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+from dispatcher import percentile
+
+BOT_USER_ID = 100000000000000001
+APPLICATION_ID = 100000000000000002
+DISCORD_EPOCH = 1420070400000
+
+
+def json_response(data, status=200, headers=None):
+    # discord.py razbere JSON samo, če je Content-Type točno "application/json" (brez charset)
+    return web.Response(body=json.dumps(data).encode(), status=status,
+                        headers={"Content-Type": "application/json", **(headers or {})})
+
+
+def user_payload(user_id, bot=False):
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "global_name": None,
+            "avatar": None, "bot": bot}
+
+
+# --- NADOMESTEK ZA DISCORD REST API ---
+class FakeDiscordAPI:
+    """Lokalni HTTP strežnik z odzivi v obliki, ki jo pričakuje discord.py."""
+
+    def __init__(self, latency=0.0, rate_limit=False):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.requests = Counter()
+        self.rate_limited = 0
+        self.messages = {}                               # message_id -> payload
+        self.channel_messages = defaultdict(asyncio.Queue)  # channel_id -> prejeta sporočila
+        self.callbacks = {}                              # interaction_id -> future (tip, data)
+        self._ids = itertools.count(1)
+        self._buckets = {}                               # channel_id -> (okno, število)
+        self._runner = None
+        self.port = None
+
+    def snowflake(self):
+        return ((int(time.time() * 1000) - DISCORD_EPOCH) << 22) | (next(self._ids) & 0x3FFFFF)
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_get("/api/v10/users/@me", self.get_me)
+        app.router.add_get("/api/v10/oauth2/applications/@me", self.get_application)
+        app.router.add_post("/api/v10/channels/{channel_id}/messages", self.post_message)
+        app.router.add_post("/api/v10/interactions/{interaction_id}/{token}/callback", self.post_callback)
+        app.router.add_route("*", "/{tail:.*}", self.fallback)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{self.port}/api/v10"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    # --- pomožno ---
+    def message_payload(self, channel_id, body):
+        message_id = self.snowflake()
+        payload = {
+            "id": str(message_id), "channel_id": str(channel_id), "author": user_payload(BOT_USER_ID, bot=True),
+            "content": body.get("content") or "", "timestamp": datetime.now(timezone.utc).isoformat(),
+            "edited_timestamp": None, "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [],
+            "attachments": body.get("attachments") or [], "embeds": body.get("embeds") or [], "components": body.get("components") or [],
+            "pinned": False, "type": 0, "flags": body.get("flags") or 0,
+        }
+        self.messages[message_id] = payload
+        return payload
+
+    def _limited(self, channel_id):
+        """Posnema Discordovo omejitev 5 sporočil / 5 s na kanal; vrne čas čakanja ali None."""
+        now = time.monotonic()
+        window, count = self._buckets.get(channel_id, (now, 0))
+        if now - window >= 5:
+            window, count = now, 0
+        if count >= 5:
+            return 5 - (now - window)
+        self._buckets[channel_id] = (window, count + 1)
+        return None
+
+    async def _body(self, request):
+        """JSON telo zahteve; sporočila s priponkami pridejo kot multipart s poljem payload_json."""
+        if request.content_type != "multipart/form-data":
+            return await request.json()
+        form = await request.post()
+        body = json.loads(form["payload_json"])
+        body["attachments"] = [{"id": str(self.snowflake()), "filename": f.filename, "size": len(f.file.read()),
+                                "url": "", "proxy_url": ""} for k, f in form.items() if k.startswith("files[")]
+        return body
+
+    async def _delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    # --- končne točke ---
+    async def get_me(self, request):
+        return json_response(user_payload(BOT_USER_ID, bot=True))
+
+    async def get_application(self, request):
+        return json_response({
+            "id": str(APPLICATION_ID), "name": "UMHelper (loadtest)", "icon": None, "description": "",
+            "rpc_origins": [], "bot_public": True, "bot_require_code_grant": False, "verify_key": "0" * 64,
+            "owner": user_payload(BOT_USER_ID + 10), "flags": 0, "team": None,
+        })
+
+    async def post_message(self, request):
+        self.requests["message"] += 1
+        channel_id = int(request.match_info["channel_id"])
+        if self.rate_limit:
+            retry_after = self._limited(channel_id)
+            if retry_after is not None:
+                self.rate_limited += 1
+                return json_response(
+                    {"message": "You are being rate limited.", "retry_after": retry_after, "global": False},
+                    status=429,
+                    headers={"X-RateLimit-Limit": "5", "X-RateLimit-Remaining": "0",
+                             "X-RateLimit-Reset-After": f"{retry_after:.3f}", "X-RateLimit-Bucket": f"ch{channel_id}",
+                             "X-RateLimit-Scope": "user"},
+                )
+        await self._delay()
+        payload = self.message_payload(channel_id, await self._body(request))
+        self.channel_messages[channel_id].put_nowait(payload)
+        return json_response(payload)
+
+    async def post_callback(self, request):
+        self.requests["callback"] += 1
+        await self._delay()
+        interaction_id = int(request.match_info["interaction_id"])
+        body = await request.json()
+        data = body.get("data") or {}
+        message = None
+        if body.get("type") == 4:
+            message = self.message_payload(0, data)
+        fut = self.callbacks.pop(interaction_id, None)
+        if fut is not None and not fut.done():
+            fut.set_result((body.get("type"), data))
+        return json_response({
+            "interaction": {"id": str(interaction_id), "type": 3, "response_message_id": message["id"] if message else None,
+                            "response_message_loading": False, "response_message_ephemeral": bool(data.get("flags", 0) & 64)},
+            "resource": {"type": body.get("type"), **({"message": message} if message else {})},
+        })
+
+    async def fallback(self, request):
+        self.requests[f"{request.method} {request.path}"] += 1
+        await self._delay()
+        return json_response({})
+
+
+# --- NADOMESTEK ZA GATEWAY ---
+class FakeGateway:
+    """Pošilja gateway dogodke neposredno v ConnectionState bota."""
+
+    def __init__(self, bot, api):
+        self.bot = bot
+        self.api = api
+        self.state = bot._connection
+
+    def add_guild(self, guild_id, owner_id, channel_ids):
+        channels = [{"id": str(cid), "type": 0, "name": f"kanal-{i}", "position": i, "permission_overwrites": [],
+                     "nsfw": False, "parent_id": None, "guild_id": str(guild_id)} for i, cid in enumerate(channel_ids)]
+        roles = [{"id": str(guild_id), "name": "@everyone", "permissions": "1024", "position": 0, "color": 0,
+                  "hoist": False, "managed": False, "mentionable": False, "flags": 0}]
+        return self.state._add_guild_from_data({
+            "id": str(guild_id), "name": f"Strežnik {guild_id}", "owner_id": str(owner_id), "channels": channels,
+            "roles": roles, "emojis": [], "stickers": [], "features": [], "member_count": 1, "members": [],
+            "threads": [], "unavailable": False,
+        })
+
+    def member_payload(self, user_id):
+        return {"user": user_payload(user_id), "roles": [], "joined_at": datetime.now(timezone.utc).isoformat(),
+                "deaf": False, "mute": False, "flags": 0, "permissions": "1024"}
+
+    async def wait_for_view(self, message):
+        """discord.py registrira View šele, ko dobi HTTP odgovor; pravi uporabnik pred tem ne more klikniti."""
+        if not message.get("components"):
+            return
+        message_id = int(message["id"])
+        custom_id = message["components"][0]["components"][0]["custom_id"]
+        views = self.state._view_store._views
+        while not any(key[1] == custom_id for key in views.get(message_id, {})):
+            await asyncio.sleep(0.001)
+
+    async def message(self, guild_id, channel_id, user_id, content):
+        """MESSAGE_CREATE; vrne prvo sporočilo, ki ga bot pošlje v kanal."""
+        member = self.member_payload(user_id)
+        self.state.parsers["MESSAGE_CREATE"]({
+            "id": str(self.api.snowflake()), "channel_id": str(channel_id), "guild_id": str(guild_id),
+            "author": member["user"], "member": {k: v for k, v in member.items() if k != "user"},
+            "content": content, "timestamp": datetime.now(timezone.utc).isoformat(), "edited_timestamp": None,
+            "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [],
+            "embeds": [], "pinned": False, "type": 0,
+        })
+        reply = await self.api.channel_messages[channel_id].get()
+        await self.wait_for_view(reply)
+        return reply
+
+    async def select(self, guild_id, channel_id, user_id, message, values):
+        """INTERACTION_CREATE za izbiro v prvem Select meniju sporočila; vrne (tip odgovora, data)."""
+        component = message["components"][0]["components"][0]
+        interaction_id = self.api.snowflake()
+        fut = asyncio.get_running_loop().create_future()
+        self.api.callbacks[interaction_id] = fut
+        self.state.parsers["INTERACTION_CREATE"]({
+            "id": str(interaction_id), "application_id": str(APPLICATION_ID), "type": 3, "token": f"tok{interaction_id}",
+            "version": 1, "guild_id": str(guild_id), "channel_id": str(channel_id),
+            "channel": {"id": str(channel_id), "type": 0, "guild_id": str(guild_id)},
+            "member": self.member_payload(user_id), "message": message, "attachment_size_limit": 8 * 1024 * 1024,
+            "data": {"component_type": component["type"], "custom_id": component["custom_id"], "values": values},
+            "locale": "sl", "guild_locale": "sl", "app_permissions": "0", "entitlements": [],
+        })
+        return await fut
+
+
+# --- PODATKI ---
+def seed_database(path, guilds, subjects, deadlines_per_guild):
+    """Napolni testno bazo: ena smer, 3 letniki, po 2 semestra, `subjects` predmetov na semester."""
+    with sqlite3.connect(path) as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO study_programs (name) VALUES ('Računalništvo')")
+        program_id = cur.lastrowid
+        first_semester = None
+        for y in range(1, 4):
+            cur.execute("INSERT INTO years (program_id, number) VALUES (?, ?)", (program_id, y))
+            year_id = cur.lastrowid
+            for s in (1, 2):
+                cur.execute("INSERT INTO semesters (year_id, number) VALUES (?, ?)", (year_id, s))
+                semester_id = cur.lastrowid
+                first_semester = first_semester or (year_id, semester_id)
+                cur.executemany("INSERT INTO subjects (semester_id, name, acronym, professor, ects) VALUES (?, ?, ?, ?, 6)",
+                                [(semester_id, f"Predmet {y}{s}{i}", f"P{y}{s}{i}", "dr. Profesor") for i in range(subjects)])
+        year_id, semester_id = first_semester
+        in_week = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d")
+        cur.execute("SELECT id FROM subjects WHERE semester_id = ?", (semester_id,))
+        subject_ids = [r[0] for r in cur.fetchall()]
+        for guild_id, notify_channel in guilds:
+            cur.execute("""INSERT INTO server_config (guild_id, current_program_id, current_year_id, current_semester_id, notification_channel_id)
+                           VALUES (?, ?, ?, ?, ?)""", (guild_id, program_id, year_id, semester_id, notify_channel))
+            cur.executemany("INSERT INTO deadlines (subject_id, guild_id, deadline_type, date_time, description) VALUES (?, ?, 'Izpit', ?, 'Rok')",
+                            [(subject_ids[i % len(subject_ids)], guild_id, in_week) for i in range(deadlines_per_guild)])
+        conn.commit()
+
+
+# --- SCENARIJI ---
+async def scenario_arhiv(gw, guild_id, channel_id, user_id, steps):
+    t0 = time.perf_counter()
+    msg = await gw.message(guild_id, channel_id, user_id, "!arhiv")
+    steps["!arhiv"].append(time.perf_counter() - t0)
+    for name in ("LetnikSelect", "SemesterSelect", "PredmetSelect"):
+        component = msg["components"][0]["components"][0]
+        t = time.perf_counter()
+        kind, data = await gw.select(guild_id, channel_id, user_id, msg, [component["options"][0]["value"]])
+        steps[name].append(time.perf_counter() - t)
+        if kind == 7:
+            msg = {**msg, "components": data.get("components", [])}
+            await gw.wait_for_view(msg)
+    return time.perf_counter() - t0
+
+
+async def scenario_dodaj_rok(gw, guild_id, channel_id, user_id, steps):
+    t0 = time.perf_counter()
+    reply = await gw.message(guild_id, channel_id, user_id, "!dodaj_rok P111 Izpit 20.06.2030 Obremenitveni test")
+    steps["!dodaj_rok"].append(time.perf_counter() - t0)
+    if not reply["content"].startswith("✅"):
+        raise RuntimeError(reply["content"])
+    return time.perf_counter() - t0
+
+
+def report(title, totals, steps, errors, elapsed):
+    print(f"\n=== {title} ===")
+    print(f"Uspešnih: {len(totals)}  Napak: {errors}  Čas: {elapsed:.2f} s  Prepustnost: {len(totals) / elapsed:.1f} /s")
+    rows = [("skupaj", totals)] + list(steps.items())
+    for name, values in rows:
+        print(f"  {name:<16} p50 {percentile(values, 50) * 1000:8.1f} ms   p99 {percentile(values, 99) * 1000:8.1f} ms   max {max(values, default=0) * 1000:8.1f} ms")
+
+
+async def run(args):
+    workdir = tempfile.mkdtemp(prefix="umhelper-loadtest-")
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "studij.db")
+    os.environ["BACKUP_DIR"] = os.path.join(workdir, "backups")
+    os.environ.setdefault("FEED_PORT", "0")
+    os.environ.setdefault("DISCORD_TOKEN", "loadtest")
+
+    import discord
+    import main as bot_main
+
+    api = FakeDiscordAPI(latency=args.latency_ms / 1000, rate_limit=args.rate_limit)
+    discord.http.Route.BASE = await api.start()
+    bot = bot_main.bot
+    await bot_main.init_db()
+
+    # Strežniki: lastnik je "administrator", vsak uporabnik dobi svoj kanal
+    guild_ids = [api.snowflake() for _ in range(args.guilds)]
+    owners = {gid: api.snowflake() for gid in guild_ids}
+    user_channels = defaultdict(list)
+    users = []
+    for i in range(args.users):
+        gid = guild_ids[i % len(guild_ids)]
+        cid = api.snowflake()
+        user_channels[gid].append(cid)
+        users.append((gid, cid, owners[gid] if args.scenario == "dodaj_rok" else api.snowflake()))
+    notify = {gid: api.snowflake() for gid in guild_ids}
+    seed_database(os.environ["DATABASE_PATH"], notify.items(), args.subjects,
+                  args.deadlines if args.scenario == "opomniki" else 0)
+
+    await bot.login("loadtest")
+    gw = FakeGateway(bot, api)
+    for gid in guild_ids:
+        gw.add_guild(gid, owners[gid], [notify[gid]] + user_channels[gid])
+
+    try:
+        if args.scenario == "opomniki":
+            t0 = time.perf_counter()
+            await bot_main.check_deadlines()
+            elapsed = time.perf_counter() - t0
+            embeds = sum(len(m["embeds"]) for m in api.messages.values())
+            print(f"\n=== Opomniki ({args.guilds} strežnikov × {args.deadlines} rokov) ===")
+            print(f"Čas: {elapsed:.2f} s  Sporočil: {api.requests['message']}  Embedov: {embeds}  429: {api.rate_limited}")
+        else:
+            scenario = scenario_arhiv if args.scenario == "arhiv" else scenario_dodaj_rok
+            sem = asyncio.Semaphore(args.concurrency)
+            totals, steps, errors = [], defaultdict(list), Counter()
+
+            async def one(gid, cid, uid):
+                async with sem:
+                    try:
+                        totals.append(await asyncio.wait_for(scenario(gw, gid, cid, uid, steps), args.timeout))
+                    except Exception as e:
+                        errors[type(e).__name__ + (f": {e}" if str(e) else "")] += 1
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*(one(*u) for u in users))
+            elapsed = time.perf_counter() - t0
+            report(f"{args.scenario} ({args.users} uporabnikov, sočasno {args.concurrency})", totals, steps, sum(errors.values()), elapsed)
+            for name, count in errors.most_common(5):
+                print(f"  ⚠️ {count}× {name}")
+        st = bot_main.dispatcher.stats()
+        print(f"Dispatcher: poslano {st['sent']}, združeno {st['coalesced']}, napake {st['failed']}, "
+              f"čakanje p50 {st['wait_p50_ms']:.1f} ms / p99 {st['wait_p99_ms']:.1f} ms")
+        print(f"HTTP zahtevki: {dict(api.requests)}")
+    finally:
+        await bot.close()
+        await api.stop()
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Obremenitveni test UMHelper bota brez pravega Discorda.")
+    p.add_argument("--scenario", choices=["arhiv", "dodaj_rok", "opomniki"], default="arhiv")
+    p.add_argument("--users", type=int, default=1000, help="število simuliranih uporabnikov")
+    p.add_argument("--concurrency", type=int, default=100, help="največ sočasnih uporabnikov")
+    p.add_argument("--guilds", type=int, default=10, help="število strežnikov")
+    p.add_argument("--subjects", type=int, default=8, help="predmetov na semester")
+    p.add_argument("--deadlines", type=int, default=12, help="rokov na strežnik (scenarij opomniki)")
+    p.add_argument("--latency-ms", type=float, default=20, help="umetna zakasnitev REST odgovorov")
+    p.add_argument("--rate-limit", action="store_true", help="posnemaj omejitev 5 sporočil / 5 s na kanal")
+    p.add_argument("--timeout", type=float, default=60, help="največji čas enega uporabnika")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args(sys.argv[1:])))
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from dispatcher import percentile
+
+# --- NADZOR ZAKASNITVE ZANKE (EVENT LOOP LAG) ---
+# Opravilo v zanki vsakih LAG_INTERVAL s izmeri, koliko kasneje se je zbudilo od
+# načrtovanega. Ločena nit opazuje zadnji "utrip" opravila; če zanka stoji dlje kot
+# LAG_THRESHOLD, izpiše sklad glavne niti, torej kodo, ki zanko blokira.
+LAG_INTERVAL = 0.25
+LAG_THRESHOLD = float(os.getenv('LOOP_LAG_THRESHOLD_MS', '250')) / 1000
+LAG_HISTORY = 2400 # ~10 minut pri LAG_INTERVAL 0.25 s
+STACK_FRAMES = 15
+
+
+def install_uvloop():
+    """Če je USE_UVLOOP vklopljen in je uvloop nameščen, ga nastavi kot zanko; vrne True ob uspehu."""
+    if os.getenv('USE_UVLOOP', '').lower() not in ('1', 'true', 'da', 'on'):
+        return False
+    try:
+        import uvloop
+    except ImportError:
+        print("⚠️ USE_UVLOOP je vklopljen, a uvloop ni nameščen; uporabljam privzeto zanko.")
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
+class LoopMonitor:
+    def __init__(self, interval=LAG_INTERVAL, threshold=LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self._lags = deque(maxlen=LAG_HISTORY)
+        self._beat = time.monotonic()
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._loop_thread_id = None
+        self._reported_beat = None
+        self.stalls = 0
+        self.last_stall = None # (trajanje v s, prva vrstica sklada)
+
+    # --- ŽIVLJENJSKI CIKEL ---
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._measure(), name="loop-lag")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # --- MERJENJE ---
+    async def _measure(self):
+        while True:
+            start = self._beat
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - start - self.interval)
+            self._lags.append(lag)
+            self._beat = now
+            if lag >= self.threshold:
+                self.stalls += 1
+                # Mesto blokade poznamo, če jo je nit ujela med trajanjem
+                where = self.last_stall[1] if self.last_stall and self._reported_beat == start else None
+                self.last_stall = (lag, where)
+                print(f"🐢 Zanka je bila blokirana {lag * 1000:.0f} ms (skupaj {self.stalls}×)")
+
+    def _watch(self):
+        # Nit se zbudi večkrat na prag, da sklad ujame, dokler blokada še traja
+        while not self._stop.wait(self.threshold / 4):
+            beat = self._beat
+            blocked = time.monotonic() - beat - self.interval
+            if blocked < self.threshold or self._reported_beat == beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._reported_beat = beat
+            stack = traceback.format_stack(frame)[-STACK_FRAMES:]
+            self.last_stall = (blocked, stack[-1].strip().splitlines()[0])
+            print(f"🐢 Zanka blokirana že {blocked * 1000:.0f} ms, trenutni sklad:\n{''.join(stack)}", flush=True)
+
+    def stats(self):
+        lags = list(self._lags)
+        return {
+            "lag_p50_ms": percentile(lags, 50) * 1000,
+            "lag_p99_ms": percentile(lags, 99) * 1000,
+            "lag_max_ms": max(lags) * 1000 if lags else 0.0,
+            "stalls": self.stalls,
+            "last_stall_ms": self.last_stall[0] * 1000 if self.last_stall else 0.0,
+            "last_stall_where": self.last_stall[1] if self.last_stall else None,
+        }
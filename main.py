@@ -5,22 +5,84 @@ import aiosqlite
 import asyncio
 import os
 import random
+import time
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+from dispatcher import MessageDispatcher, PRIORITY_REMINDER
+from repository import Repository
+import repository
+from profiler import Profiler
+from looplag import LoopMonitor, install_uvloop
+from icalfeed import FeedServer, feed_secret, feed_url
+import profiler as prof
+import stats
+import backup
+import export
 
 # --- KONFIGURACIJA ---
 load_dotenv()
 TOKEN = os.getenv('DISCORD_TOKEN')
 DATABASE_NAME = os.getenv('DATABASE_PATH', 'studij.db')
+TIMEZONE = ZoneInfo(os.getenv('BOT_TIMEZONE', 'Europe/Ljubljana')) # Za uro dnevnega povzetka
+GUILD_RETENTION_DAYS = int(os.getenv('GUILD_RETENTION_DAYS', '30')) # Toliko dni ostanejo podatki strežnika, s katerega je bot odstranjen
 
 if not TOKEN:
     print("❌ NAPAKA: Token ni najden! Preveri .env datoteko.")
     exit()
 
+# --- ČASI ZAGONA ---
+startup_t0 = time.perf_counter()
+startup_done = False # on_ready se sproži tudi po vsaki ponovni povezavi; zagonski koraki tečejo le enkrat
+
+def log_phase(name, start):
+    print(f"⏱️ {name}: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+async def timed(name, coro):
+    start = time.perf_counter()
+    result = await coro
+    log_phase(name, start)
+    return result
+
+class StudijBot(commands.Bot):
+    profile_task = None # Čaka na konec !profil; referenca prepreči, da bi ga pobral GC
+
+    async def close(self):
+        if self.profile_task is not None:
+            self.profile_task.cancel()
+        await super().close()
+        await dispatcher.stop()
+        await loop_monitor.stop()
+        await feeds.stop()
+        await repo.close() # Nit povezave z bazo mora biti zaprta, sicer proces ne konča
+
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+bot = StudijBot(command_prefix='!', intents=intents)
 bot.remove_command('help') # Odstranimo privzeti help
+dispatcher = MessageDispatcher() # Vsa odhodna sporočila gredo skozi to vrsto
+repo = Repository(DATABASE_NAME) # Ena povezava z bazo za celoten bot
+profiler = Profiler() # !profil; ko ni vklopljen, kljuke ne naredijo ničesar
+loop_monitor = LoopMonitor() # Meri zakasnitev zanke in izpiše sklad ob blokadi
+feeds = FeedServer(repo, feed_secret(TOKEN)) # Koledarji .ics na FEED_PORT
+
+def semester_options(semestri):
+    return [discord.SelectOption(label=f"{'Zimski' if s.number == 1 else 'Poletni'} semester", value=str(s.id)) for s in semestri]
+
+def year_options(letniki):
+    return [discord.SelectOption(label=f"{y.number}. letnik", value=str(y.id)) for y in letniki]
+
+def subject_options(predmeti):
+    return [discord.SelectOption(label=f"{p.name} ({p.acronym})"[:100], value=str(p.id)) for p in predmeti]
+
+DISCORD_FILE_LIMIT = 8 * 1024 * 1024
+
+async def send_file(ctx, besedilo, path):
+    """Pošlje besedilo z datoteko; večje od omejitve Discorda ostanejo samo na disku."""
+    if os.path.getsize(path) <= DISCORD_FILE_LIMIT:
+        await dispatcher.send(ctx, besedilo, file=discord.File(path, filename=os.path.basename(path)))
+    else:
+        await dispatcher.send(ctx, f"{besedilo}\nDatoteka je prevelika za Discord, najdeš jo v `{os.path.dirname(path)}`.")
 
 # --- VARNOSTNI VIEW (Dovoli klik samo avtorju) ---
 class AuthorOnlyView(View):
@@ -28,59 +90,25 @@ class AuthorOnlyView(View):
         super().__init__(timeout=180) # Meni deluje 3 minute
         self.author = author
 
+    def add_item(self, item):
+        # Kljuka za !profil ukaz <ImeMenija>: vsak klic menija je eno izvajanje
+        callback = item.callback
+        async def profiled(interaction):
+            with profiler.section(type(item).__name__):
+                return await callback(interaction)
+        item.callback = profiled
+        return super().add_item(item)
+
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         if interaction.user.id != self.author.id:
-            await interaction.response.send_message("⛔ To ni tvoj meni! Napiši svoj ukaz.", ephemeral=True)
+            await dispatcher.respond(interaction, "⛔ To ni tvoj meni! Napiši svoj ukaz.", ephemeral=True)
             return False
         return True
 
 # --- BAZA PODATKOV (Z GUILD_ID LOČEVANJEM) ---
 async def init_db():
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        # Globalne tabele (enake za vse)
-        await db.execute("CREATE TABLE IF NOT EXISTS study_programs (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE)")
-        await db.execute("CREATE TABLE IF NOT EXISTS years (id INTEGER PRIMARY KEY AUTOINCREMENT, program_id INTEGER, number INTEGER, FOREIGN KEY(program_id) REFERENCES study_programs(id))")
-        await db.execute("CREATE TABLE IF NOT EXISTS semesters (id INTEGER PRIMARY KEY AUTOINCREMENT, year_id INTEGER, number INTEGER, FOREIGN KEY(year_id) REFERENCES years(id))")
-        await db.execute("CREATE TABLE IF NOT EXISTS subjects (id INTEGER PRIMARY KEY AUTOINCREMENT, semester_id INTEGER, name TEXT NOT NULL, acronym TEXT, professor TEXT, assistants TEXT, ects INTEGER, FOREIGN KEY(semester_id) REFERENCES semesters(id))")
-        
-        # Lokalne tabele (vsebujejo guild_id)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS materials (
-                id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                subject_id INTEGER, 
-                guild_id INTEGER, -- <--- VARNOST: ID strežnika
-                url TEXT NOT NULL, 
-                description TEXT, 
-                type TEXT, 
-                FOREIGN KEY(subject_id) REFERENCES subjects(id)
-            )
-        """)
-        
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS server_config (
-                guild_id INTEGER PRIMARY KEY,
-                current_program_id INTEGER,
-                current_year_id INTEGER,
-                current_semester_id INTEGER,
-                notification_channel_id INTEGER
-            )
-        """)
-        
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS deadlines (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                subject_id INTEGER,
-                guild_id INTEGER, -- <--- VARNOST: ID strežnika
-                deadline_type TEXT,
-                date_time TEXT,
-                description TEXT,
-                sent_week BOOLEAN DEFAULT 0,
-                sent_day BOOLEAN DEFAULT 0,
-                FOREIGN KEY(subject_id) REFERENCES subjects(id)
-            )
-        """)
-        await db.commit()
-        print("Baza podatkov je pripravljena (Varnostna shema: Guild ID).")
+    await asyncio.to_thread(repository.init_schema, DATABASE_NAME)
+    print("Baza podatkov je pripravljena (Varnostna shema: Guild ID).")
 
 # --- UI RAZREDI ZA ARHIV & PREDMETE ---
 
@@ -94,58 +122,39 @@ class PredmetSelect(Select):
         now_str = datetime.now().strftime("%Y-%m-%d")
         guild_id = interaction.guild_id # Trenutni server
 
-        async with aiosqlite.connect(DATABASE_NAME) as db:
-            # 1. Metapodatki (Globalni)
-            cursor = await db.execute("SELECT name, acronym, ects, professor, assistants FROM subjects WHERE id = ?", (subject_id,))
-            res = await cursor.fetchone()
-            name, acronym, ects, prof, asst = res
-            
-            # 2. Gradiva (Filtrirano po guild_id)
-            # Prikaži če se guild_id ujema ALI če je NULL (globalno gradivo, ki ga doda owner)
-            cursor = await db.execute("""
-                SELECT description, url 
-                FROM materials 
-                WHERE subject_id = ? AND (guild_id = ? OR guild_id IS NULL)
-            """, (subject_id, guild_id))
-            gradiva = await cursor.fetchall()
-            
-            # 3. Roki (Filtrirano po guild_id + datum)
-            cursor = await db.execute("""
-                SELECT deadline_type, date_time, description 
-                FROM deadlines 
-                WHERE subject_id = ? AND date_time >= ? AND (guild_id = ? OR guild_id IS NULL)
-                ORDER BY date_time ASC
-            """, (subject_id, now_str, guild_id))
-            roki = await cursor.fetchall()
+        # 1. Metapodatki (Globalni), 2. Gradiva in 3. Roki (Filtrirano po guild_id)
+        predmet = await repo.subject_detail(subject_id)
+        gradiva = await repo.materials_for(subject_id, guild_id)
+        roki = await repo.upcoming_for(subject_id, guild_id, now_str)
 
         # Izdelava Embeda
-        embed = discord.Embed(title=f"{name} ({acronym})", color=discord.Color.blue())
+        embed = discord.Embed(title=f"{predmet.name} ({predmet.acronym})", color=discord.Color.blue())
         
-        desc_text = f"**ECTS:** {ects}\n"
-        if prof: desc_text += f"**Nosilec:** {prof}\n"
-        if asst: desc_text += f"**Asistenti:** {asst}\n"
+        desc_text = f"**ECTS:** {predmet.ects}\n"
+        if predmet.professor: desc_text += f"**Nosilec:** {predmet.professor}\n"
+        if predmet.assistants: desc_text += f"**Asistenti:** {predmet.assistants}\n"
         embed.description = desc_text
 
         if gradiva:
             materials_text = ""
-            for desc, url in gradiva:
-                materials_text += f"🔹 [{desc}]({url})\n"
+            for gradivo in gradiva:
+                materials_text += f"🔹 [{gradivo.description}]({gradivo.url})\n"
             embed.add_field(name="📂 Gradiva", value=materials_text, inline=False)
         else:
             embed.add_field(name="📂 Gradiva", value="*Ni gradiv*", inline=False)
 
         if roki:
             roki_text = ""
-            for dtype, dtime, desc in roki:
-                date_obj = datetime.strptime(dtime, "%Y-%m-%d").strftime("%d. %m. %Y")
-                roki_text += f"🔸 **{dtype}**: {date_obj}"
-                if desc: roki_text += f" *({desc})*"
+            for rok in roki:
+                date_obj = datetime.strptime(rok.date_time, "%Y-%m-%d").strftime("%d. %m. %Y")
+                roki_text += f"🔸 **{rok.deadline_type}**: {date_obj}"
+                if rok.description: roki_text += f" *({rok.description})*"
                 roki_text += "\n"
             embed.add_field(name="⏳ Prihajajoči roki", value=roki_text, inline=False)
         else:
             embed.add_field(name="⏳ Prihajajoči roki", value="✅ Ni rokov.", inline=False)
         
-        await interaction.response.send_message(embed=embed, ephemeral=False)
+        await dispatcher.respond(interaction, embed=embed, ephemeral=False)
 
 class SemesterSelect(Select):
     def __init__(self, year_id, options):
@@ -154,19 +163,15 @@ class SemesterSelect(Select):
 
     async def callback(self, interaction: discord.Interaction):
         semester_id = int(self.values[0])
-        async with aiosqlite.connect(DATABASE_NAME) as db:
-            cursor = await db.execute("SELECT id, name, acronym FROM subjects WHERE semester_id = ?", (semester_id,))
-            predmeti = await cursor.fetchall()
+        predmeti = await repo.subjects(semester_id)
 
         if not predmeti:
-            return await interaction.response.send_message("❌ V tem semestru ni predmetov.", ephemeral=True)
+            return await dispatcher.respond(interaction, "❌ V tem semestru ni predmetov.", ephemeral=True)
 
-        options = [discord.SelectOption(label=f"{name} ({acronym})"[:100], value=str(pid)) for pid, name, acronym in predmeti]
-        
         view = AuthorOnlyView(interaction.user)
         view.add_item(PredmetSelect(semester_id))
-        view.children[0].options = options
-        await interaction.response.edit_message(content="⬇️ Zdaj izberi predmet:", view=view)
+        view.children[0].options = subject_options(predmeti)
+        await dispatcher.edit(interaction, content="⬇️ Zdaj izberi predmet:", view=view)
 
 class LetnikSelect(Select):
     def __init__(self, program_id, options):
@@ -175,18 +180,16 @@ class LetnikSelect(Select):
 
     async def callback(self, interaction: discord.Interaction):
         year_id = int(self.values[0])
-        async with aiosqlite.connect(DATABASE_NAME) as db:
-            cursor = await db.execute("SELECT id, number FROM semesters WHERE year_id = ? ORDER BY number ASC", (year_id,))
-            semestri = await cursor.fetchall()
+        semestri = await repo.semesters(year_id)
 
         if not semestri:
-            return await interaction.response.send_message("❌ Ta letnik nima semestrov.", ephemeral=True)
+            return await dispatcher.respond(interaction, "❌ Ta letnik nima semestrov.", ephemeral=True)
 
-        options = [discord.SelectOption(label=f"{'Zimski' if num==1 else 'Poletni'} semester", value=str(sid)) for sid, num in semestri]
+        options = semester_options(semestri)
         
         view = AuthorOnlyView(interaction.user)
         view.add_item(SemesterSelect(year_id, options))
-        await interaction.response.edit_message(content="⬇️ Zdaj izberi semester:", view=view)
+        await dispatcher.edit(interaction, content="⬇️ Zdaj izberi semester:", view=view)
 
 
 # --- UI RAZREDI ZA SETUP ---
@@ -199,13 +202,8 @@ class SetupChannelSelect(ChannelSelect):
 
     async def callback(self, interaction: discord.Interaction):
         channel = self.values[0]
-        async with aiosqlite.connect(DATABASE_NAME) as db:
-            await db.execute("""
-                INSERT OR REPLACE INTO server_config (guild_id, current_program_id, current_year_id, current_semester_id, notification_channel_id)
-                VALUES (?, ?, ?, ?, ?)
-            """, (interaction.guild_id, self.prog_id, self.year_id, self.sem_id, channel.id))
-            await db.commit()
-        await interaction.response.edit_message(content=f"✅ **Setup zaključen!**\nObvestila o rokih bodo prihajala v {channel.mention}.", view=None)
+        await repo.save_setup(interaction.guild_id, self.prog_id, self.year_id, self.sem_id, channel.id)
+        await dispatcher.edit(interaction, content=f"✅ **Setup zaključen!**\nObvestila o rokih bodo prihajala v {channel.mention}.", view=None)
 
 class SetupSemesterSelect(Select):
     def __init__(self, program_id, year_id, options):
@@ -217,7 +215,7 @@ class SetupSemesterSelect(Select):
         sem_id = int(self.values[0])
         view = AuthorOnlyView(interaction.user)
         view.add_item(SetupChannelSelect(self.prog_id, self.year_id, sem_id))
-        await interaction.response.edit_message(content="📢 **Zadnji korak:**\nIzberi kanal, kamor naj bot pošilja opozorila:", view=view)
+        await dispatcher.edit(interaction, content="📢 **Zadnji korak:**\nIzberi kanal, kamor naj bot pošilja opozorila:", view=view)
 
 class SetupLetnikSelect(Select):
     def __init__(self, program_id, options):
@@ -226,14 +224,12 @@ class SetupLetnikSelect(Select):
 
     async def callback(self, interaction: discord.Interaction):
         year_id = int(self.values[0])
-        async with aiosqlite.connect(DATABASE_NAME) as db:
-            cursor = await db.execute("SELECT id, number FROM semesters WHERE year_id = ? ORDER BY number ASC", (year_id,))
-            semestri = await cursor.fetchall()
-        options = [discord.SelectOption(label=f"{'Zimski' if num==1 else 'Poletni'} semester", value=str(sid)) for sid, num in semestri]
+        semestri = await repo.semesters(year_id)
+        options = semester_options(semestri)
         
         view = AuthorOnlyView(interaction.user)
         view.add_item(SetupSemesterSelect(self.prog_id, year_id, options))
-        await interaction.response.edit_message(content="⬇️ Izberi semester:", view=view)
+        await dispatcher.edit(interaction, content="⬇️ Izberi semester:", view=view)
 
 class SetupSmerSelect(Select):
     def __init__(self, options):
@@ -241,14 +237,11 @@ class SetupSmerSelect(Select):
     
     async def callback(self, interaction: discord.Interaction):
         prog_id = int(self.values[0])
-        async with aiosqlite.connect(DATABASE_NAME) as db:
-            cursor = await db.execute("SELECT id, number FROM years WHERE program_id = ? ORDER BY number ASC", (prog_id,))
-            letniki = await cursor.fetchall()
-        options = [discord.SelectOption(label=f"{num}. letnik", value=str(lid)) for lid, num in letniki]
+        options = year_options(await repo.years(prog_id))
         
         view = AuthorOnlyView(interaction.user)
         view.add_item(SetupLetnikSelect(prog_id, options))
-        await interaction.response.edit_message(content="⬇️ Izberi letnik:", view=view)
+        await dispatcher.edit(interaction, content="⬇️ Izberi letnik:", view=view)
 
 
 # --- UI ZA NASTAVITVE ---
@@ -258,10 +251,8 @@ class SettingsChannelSelect(ChannelSelect):
 
     async def callback(self, interaction: discord.Interaction):
         channel = self.values[0]
-        async with aiosqlite.connect(DATABASE_NAME) as db:
-            await db.execute("UPDATE server_config SET notification_channel_id = ? WHERE guild_id = ?", (channel.id, interaction.guild_id))
-            await db.commit()
-        await interaction.response.edit_message(content=f"✅ Kanal za obvestila uspešno spremenjen na {channel.mention}.", view=None)
+        await repo.set_channel(interaction.guild_id, channel.id)
+        await dispatcher.edit(interaction, content=f"✅ Kanal za obvestila uspešno spremenjen na {channel.mention}.", view=None)
 
 # --- UI RAZREDI ZA POSODOBI ---
 class AdminSemesterSelect(Select):
@@ -273,13 +264,8 @@ class AdminSemesterSelect(Select):
     async def callback(self, interaction: discord.Interaction):
         semester_id = int(self.values[0])
         guild_id = interaction.guild_id
-        async with aiosqlite.connect(DATABASE_NAME) as db:
-            await db.execute("""
-                UPDATE server_config SET current_program_id = ?, current_year_id = ?, current_semester_id = ?
-                WHERE guild_id = ?
-            """, (self.program_id, self.year_id, semester_id, guild_id))
-            await db.commit()
-        await interaction.response.edit_message(content=f"✅ **Uspešno posodobljeno!**\nNov semester je nastavljen.", view=None)
+        await repo.set_semester(guild_id, self.program_id, self.year_id, semester_id)
+        await dispatcher.edit(interaction, content=f"✅ **Uspešno posodobljeno!**\nNov semester je nastavljen.", view=None)
 
 class AdminYearSelect(Select):
     def __init__(self, program_id, options):
@@ -288,14 +274,12 @@ class AdminYearSelect(Select):
 
     async def callback(self, interaction: discord.Interaction):
         year_id = int(self.values[0])
-        async with aiosqlite.connect(DATABASE_NAME) as db:
-            cursor = await db.execute("SELECT id, number FROM semesters WHERE year_id = ? ORDER BY number ASC", (year_id,))
-            semestri = await cursor.fetchall()
-        options = [discord.SelectOption(label=f"{'Zimski' if num==1 else 'Poletni'} semester", value=str(sid)) for sid, num in semestri]
+        semestri = await repo.semesters(year_id)
+        options = semester_options(semestri)
         
         view = AuthorOnlyView(interaction.user)
         view.add_item(AdminSemesterSelect(year_id, options, self.program_id))
-        await interaction.response.edit_message(content="⬇️ Izberi semester:", view=view)
+        await dispatcher.edit(interaction, content="⬇️ Izberi semester:", view=view)
 
 # --- UI ZA HELP ---
 class HelpSelect(Select):
@@ -316,6 +300,7 @@ class HelpSelect(Select):
             embed.color = discord.Color.green()
             embed.add_field(name="`!predmeti`", value="Prikaže meni s predmeti v **trenutnem** semestru (hitri dostop).", inline=False)
             embed.add_field(name="`!arhiv`", value="Brskanje po starih letnikih in semestrih.", inline=False)
+            embed.add_field(name="`!koledar`", value="Povezava do koledarja z roki (za Google/Outlook/Apple koledar).", inline=False)
             embed.set_footer(text="Uporabi te ukaze za dostop do gradiv in rokov.")
         elif value == "admin":
             embed.title = "🛠️ Ukazi za Administratorje"
@@ -325,58 +310,244 @@ class HelpSelect(Select):
             embed.add_field(name="`!posodobi`", value="Sprememba letnika ali semestra (ko se semester zamenja).", inline=False)
             embed.add_field(name="`!dodaj_rok`", value="`!dodaj_rok KRATICA Tip DD.MM.YYYY Opis`\nPrimer: `!dodaj_rok MAT Izpit 20.06.2024 Prvi rok`", inline=False)
             embed.add_field(name="`!dodaj_gradivo`", value="`!dodaj_gradivo KRATICA URL Opis`\nDodajanje povezave do zapiskov.", inline=False)
+            embed.add_field(name="`!obvestila`", value="Dnevni povzetek opomnikov (`povzetek on`), ura pošiljanja (`ura 08:00`) in dnevi pred rokom (`zamiki 7,1`).", inline=False)
         elif value == "owner":
             embed.title = "🔐 Ukazi za Lastnika Bota"
             embed.color = discord.Color.red()
             embed.description = "Ti ukazi so namenjeni samo polnjenju osnovne strukture baze."
             embed.add_field(name="Struktura", value="`!nova_smer`\n`!dodaj_letnik`\n`!dodaj_semester`\n`!dodaj_predmet`", inline=False)
+            embed.add_field(name="Diagnostika", value="`!statistika`\n`!metrike`\n`!profil`", inline=False)
+            embed.add_field(name="Varnostne kopije", value="`!varnostna_kopija`\n`!obnovi IME_KOPIJE`", inline=False)
+            embed.add_field(name="Izvoz", value="`!izvoz gradiva|roki|predmeti [csv|jsonl] [tu|streznik ID|smer ID]`", inline=False)
+
+        await dispatcher.edit(interaction, embed=embed, view=self.view)
+
+# --- ŽIVLJENJSKI CIKEL STREŽNIKOV IN KANALOV ---
+channel_cache = {} # channel_id -> kanal za obvestila (razrešen enkrat, nato iz pomnilnika)
+
+async def forget_channel(channel_id):
+    """Odklopi izbrisan/nedosegljiv kanal iz konfiguracije (nastavitve strežnika ostanejo)."""
+    channel_cache.pop(channel_id, None)
+    await repo.forget_channel(channel_id)
+
+def forget_guild_channels(guild_id):
+    feeds.invalidate(guild_id)
+    for channel_id, channel in list(channel_cache.items()):
+        if channel.guild.id == guild_id:
+            del channel_cache[channel_id]
+
+async def guild_removed(guild_id):
+    """Strežnik, s katerega je bot odstranjen, se le označi; če bota vrnejo v roku, so podatki še tam."""
+    if await repo.mark_guild_removed(guild_id, date.today().isoformat()):
+        forget_guild_channels(guild_id)
+        return True
+    return False
+
+async def purge_expired_guilds():
+    """Izbriše podatke strežnikov, odstranjenih pred več kot GUILD_RETENTION_DAYS dnevi (pred tem shrani kopijo)."""
+    meja = (date.today() - timedelta(days=GUILD_RETENTION_DAYS)).isoformat()
+    potekli = await repo.expired_guilds(meja)
+    if not potekli: return
+    try:
+        path = await asyncio.to_thread(backup.create_snapshot, label="pred-ciscenjem")
+    except Exception as e:
+        return print(f"⚠️ Kopija pred čiščenjem strežnikov ni uspela, čiščenje preskočeno: {e}")
+    for guild_id in potekli:
+        await repo.purge_guild(guild_id)
+        forget_guild_channels(guild_id)
+    print(f"🧹 Izbrisani podatki {len(potekli)} strežnikov (kopija: {os.path.basename(path)})")
+
+def forget_cached_state():
+    """Po obnovi baze ali spremembi iz admin panela pozabi vse, kar je izpeljano iz starih podatkov."""
+    repo.clear_cache() # Nastavitve strežnikov in katalog so se morda spremenili
+    feeds.invalidate() # Različice koledarjev so se lahko vrnile na starejše vrednosti (isti ETag, drugi podatki)
+    channel_cache.clear()
+
+async def prune_guilds():
+    """Uskladi oznake odstranjenih strežnikov s tem, kar se je zgodilo, medtem ko bot ni bil povezan."""
+    if not bot.guilds: return # Brez seznama strežnikov ne označujemo ničesar
+    prisotni = {g.id for g in bot.guilds}
+    odsotni = vrnjeni = 0
+    for guild_id, removed_at in (await repo.config_guilds()).items():
+        if guild_id not in prisotni and removed_at is None:
+            odsotni += await guild_removed(guild_id)
+        elif guild_id in prisotni and removed_at is not None:
+            vrnjeni += await repo.mark_guild_present(guild_id)
+    if odsotni or vrnjeni:
+        print(f"🧹 Odstranjenih strežnikov: {odsotni}, vrnjenih: {vrnjeni}")
+
+async def resolve_channel(channel_id):
+    """Vrne kanal iz predpomnilnika, iz cache-a bota ali z API klicem; None, če ni dosegljiv."""
+    channel = channel_cache.get(channel_id)
+    if channel is not None: return channel
+    channel = bot.get_channel(channel_id)
+    if channel is None:
+        try:
+            channel = await bot.fetch_channel(channel_id)
+        except (discord.NotFound, discord.Forbidden):
+            # Kanal ne obstaja več ali nimamo dostopa - ne poskušamo ga več vsako uro
+            await forget_channel(channel_id)
+            return None
+        except discord.HTTPException:
+            return None # Začasna napaka, poskusimo ob naslednjem zagonu
+    channel_cache[channel_id] = channel
+    return channel
 
-        await interaction.response.edit_message(embed=embed, view=self.view)
+@bot.event
+async def on_guild_remove(guild):
+    if await guild_removed(guild.id):
+        print(f"👋 Odstranjen s strežnika {guild.id}, lokalni podatki bodo izbrisani čez {GUILD_RETENTION_DAYS} dni.")
+
+@bot.event
+async def on_guild_join(guild):
+    if await repo.mark_guild_present(guild.id):
+        print(f"👋 Ponovno dodan na strežnik {guild.id}, nastavitve in podatki so ohranjeni.")
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    channel_cache.pop(channel.id, None)
+    # Večina izbrisanih kanalov ni kanal za obvestila; nastavitve so v predpomnilniku, zato brez pisanja v bazo
+    cfg = await repo.config(channel.guild.id)
+    if cfg is not None and cfg.channel_id == channel.id:
+        await forget_channel(channel.id)
+
+# --- OPOMNIKI: POSAMEZNI ALI DNEVNI POVZETEK ---
+DEFAULT_OFFSETS = "7,1"
+DEFAULT_DIGEST_TIME = "08:00"
+DIGEST_LINES_PER_PAGE = 20 # Krajše strani, da jih gre več v eno sporočilo (omejitev 6000 znakov)
+
+def parse_offsets(text):
+    """'7,3,1' -> (7, 3, 1); neveljavne vrednosti se preskočijo."""
+    offsets = set()
+    for part in (text or DEFAULT_OFFSETS).split(","):
+        part = part.strip()
+        if part.isdigit() and int(part) <= 60:
+            offsets.add(int(part))
+    return tuple(sorted(offsets, reverse=True))
+
+def when_text(days_left):
+    if days_left == 0: return "DANES"
+    if days_left == 1: return "JUTRI"
+    if days_left == 7: return "čez 1 teden"
+    return f"čez {days_left} dni"
+
+def reminder_embed(dtype, ddate, desc, subj_name, days_left):
+    if days_left <= 1:
+        embed = discord.Embed(title=f"🚨 {dtype} je {when_text(days_left)}!", color=discord.Color.red())
+        embed.add_field(name="Predmet", value=subj_name)
+    else:
+        embed = discord.Embed(title=f"⏳ {dtype} {when_text(days_left)}!", color=discord.Color.orange())
+        embed.add_field(name="Predmet", value=subj_name)
+        embed.add_field(name="Datum", value=ddate.strftime("%d. %m. %Y"))
+    if desc: embed.add_field(name="Opis", value=desc, inline=False)
+    return embed
+
+def digest_pages(entries):
+    """Povzetek opomnikov strežnika, razdeljen na strani; vrne [(embed, ključi opomnikov na strani)]."""
+    lines = []
+    for key, (dtype, ddate, desc, subj_name, days_left) in sorted(entries, key=lambda e: (e[1][4], e[1][3])):
+        line = f"{'🚨' if days_left <= 1 else '🔸'} **{subj_name}** – {dtype}, {ddate.strftime('%d. %m. %Y')} ({when_text(days_left)})"
+        if desc: line += f" *({desc[:100]})*"
+        lines.append((line, key))
+    pages = []
+    page, size = [], 0
+    for line, key in lines:
+        if page and (len(page) >= DIGEST_LINES_PER_PAGE or size + len(line) > 1900):
+            pages.append(page)
+            page, size = [], 0
+        page.append((line, key))
+        size += len(line) + 1
+    if page: pages.append(page)
+    out = []
+    for i, page in enumerate(pages, 1):
+        embed = discord.Embed(title="📋 Pregled prihajajočih rokov", description="\n".join(line for line, _ in page), color=discord.Color.orange())
+        if len(pages) > 1: embed.set_footer(text=f"Stran {i}/{len(pages)}")
+        out.append((embed, [key for _, key in page]))
+    return out
 
 # --- BACKGROUND TASK (S FILTRIRANJEM) ---
 @tasks.loop(hours=1)
 async def check_deadlines():
-    now = datetime.now().date()
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        cursor = await db.execute("""
-            SELECT d.id, d.deadline_type, d.date_time, d.description, d.sent_week, d.sent_day, 
-                   s.name, sc.notification_channel_id, d.guild_id
-            FROM deadlines d
-            JOIN subjects s ON d.subject_id = s.id
-            JOIN semesters sem ON s.semester_id = sem.id
-            JOIN server_config sc ON sc.current_semester_id = sem.id
-            WHERE d.date_time >= ?
-              AND (d.guild_id = sc.guild_id OR d.guild_id IS NULL)
-        """, (now.strftime("%Y-%m-%d"),))
-        
-        roki = await cursor.fetchall()
-        
-        for rok in roki:
-            rok_id, dtype, ddate_str, desc, sent_week, sent_day, subj_name, channel_id, deadline_guild_id = rok
-            if not channel_id: continue
-            
-            channel = bot.get_channel(channel_id)
-            if not channel: continue
-
-            ddate = datetime.strptime(ddate_str, "%Y-%m-%d").date()
-            days_left = (ddate - now).days
-
-            if days_left == 7 and not sent_week:
-                embed = discord.Embed(title=f"⏳ {dtype} čez 1 teden!", color=discord.Color.orange())
-                embed.add_field(name="Predmet", value=subj_name)
-                embed.add_field(name="Datum", value=ddate.strftime("%d. %m. %Y"))
-                if desc: embed.add_field(name="Opis", value=desc, inline=False)
-                await channel.send(embed=embed)
-                await db.execute("UPDATE deadlines SET sent_week = 1 WHERE id = ?", (rok_id,))
-                await db.commit()
-
-            if days_left == 1 and not sent_day:
-                embed = discord.Embed(title=f"🚨 {dtype} je JUTRI!", color=discord.Color.red())
-                embed.add_field(name="Predmet", value=subj_name)
-                if desc: embed.add_field(name="Opis", value=desc, inline=False)
-                await channel.send(embed=embed)
-                await db.execute("UPDATE deadlines SET sent_day = 1 WHERE id = ?", (rok_id,))
-                await db.commit()
+    with profiler.section("check_deadlines"):
+        await send_reminders()
+
+async def send_reminders():
+    now_local = datetime.now(TIMEZONE)
+    now = now_local.date()
+    today = now.strftime("%Y-%m-%d")
+    # Najprej razrešimo kanale; roke beremo samo za strežnike, ki jih dejansko dosežemo
+    kanali, zamiki, povzetek = {}, {}, set()
+    for cfg in await repo.notify_configs():
+        if bot.get_guild(cfg.guild_id) is None: continue
+        if cfg.digest_mode:
+            # Povzetek gre enkrat na dan, ob prvem zagonu v uri nastavljenega časa ali kasneje.
+            # Primerjamo samo ure: zanka teče vsako uro ob poljubni minuti, zato bi npr. 23:30
+            # ob zagonih ob :15 sicer zgrešili vsak dan.
+            if cfg.last_digest == today or now_local.hour < int((cfg.digest_time or DEFAULT_DIGEST_TIME)[:2]): continue
+            povzetek.add(cfg.guild_id)
+        offsets = parse_offsets(cfg.reminder_offsets)
+        if not offsets: continue
+        channel = await resolve_channel(cfg.channel_id)
+        if channel:
+            kanali[cfg.guild_id] = channel
+            zamiki[cfg.guild_id] = offsets
+    if not kanali: return
+
+    max_offset = max(max(o) for o in zamiki.values())
+    roki = await repo.due_deadlines(today, max_offset, list(kanali))
+    ze_poslani = await repo.sent_reminders(today, list(kanali))
+
+    # Zberemo zapadle opomnike po strežnikih
+    zapadli = {}
+    for rok in roki:
+        ddate = date.fromisoformat(rok.date_time) # Bistveno hitreje od strptime pri velikem številu rokov
+        days_left = (ddate - now).days
+        key = (rok.id, rok.guild_id, days_left)
+        if days_left not in zamiki[rok.guild_id] or key in ze_poslani: continue
+        zapadli.setdefault(rok.guild_id, []).append((key, (rok.deadline_type, ddate, rok.description, rok.subject_name, days_left)))
+
+    # Vse opomnike najprej postavimo v vrsto, da jih dispatcher lahko združi po kanalih
+    poslani = []
+    for n, (guild_id, items) in enumerate(zapadli.items(), 1):
+        # Med strežniki (ne sredi enega) damo zanki dihati; združevanje po kanalih ostane enako
+        if n % 100 == 0: await asyncio.sleep(0)
+        channel = kanali[guild_id]
+        if guild_id in povzetek:
+            # Vsaka stran se beleži zase; ob napaki se naslednjič pošljejo samo manjkajoči roki
+            strani = digest_pages(items)
+            for embed, keys in strani:
+                fut = dispatcher.send(channel, embed=embed, priority=PRIORITY_REMINDER)
+                poslani.append((fut, keys, guild_id))
+        else:
+            for key, item in items:
+                poslani.append((dispatcher.send(channel, embed=reminder_embed(*item), priority=PRIORITY_REMINDER), [key], None))
+
+    # Stare zapise o poslanih opomnikih sproti pobrišemo
+    await repo.prune_reminders(today)
+    if poslani:
+        # Zapise naredimo samo za uspešno poslane opomnike; ostali pridejo na vrsto ob naslednjem zagonu
+        rezultati = await asyncio.gather(*(fut for fut, _, _ in poslani), return_exceptions=True)
+        keys, neuspeli = [], set()
+        for (_, batch, digest_guild), rezultat in zip(poslani, rezultati):
+            if isinstance(rezultat, BaseException):
+                neuspeli.add(digest_guild)
+                continue
+            keys.extend(batch)
+        # Povzetek je za danes opravljen šele, ko so poslane vse njegove strani
+        digest_guilds = [gid for gid in zapadli if gid in povzetek and gid not in neuspeli]
+        await repo.mark_reminders_sent(keys, digest_guilds, today)
+
+# --- VARNOSTNE KOPIJE ---
+@tasks.loop(hours=backup.BACKUP_INTERVAL_HOURS)
+async def backup_database():
+    # Kopiranje teče v ločeni niti po majhnih korakih, zato ne blokira bota
+    with profiler.section("backup_database"):
+        try:
+            path = await asyncio.to_thread(backup.create_snapshot)
+            print(f"💾 Varnostna kopija: {path}")
+        except Exception as e:
+            print(f"⚠️ Varnostna kopija ni uspela: {e}")
+        await purge_expired_guilds()
 
 # --- STATUSI ---
 BOT_STATUSES = [
@@ -399,69 +570,91 @@ async def rotate_status():
 async def before_rotate_status():
     await bot.wait_until_ready()
 
+@bot.event
+async def setup_hook():
+    # Teče enkrat, po HTTP prijavi in pred povezavo na gateway: ko pride prvi ukaz, je vse pripravljeno
+    start = time.perf_counter()
+    await timed("povezava z bazo", repo.open())
+    repo.on_external_change = forget_cached_state
+    dispatcher.start()
+    loop_monitor.start()
+    # Poizvedbe na eni povezavi tečejo zaporedno; napolnimo predpomnilnika, ki ju berejo ukazi in meniji
+    await timed("nastavitve strežnikov", repo.warm_configs())
+    await timed("katalog", repo.warm_catalog())
+    await start_feeds()
+    log_phase("priprava pred gatewayem", start)
+
+async def start_feeds():
+    try:
+        await timed("strežnik za koledarje", feeds.start())
+    except OSError as e:
+        print(f"⚠️ Strežnik za koledarje se ni zagnal: {e}")
+
+# --- PROFILIRANJE UKAZOV ---
+@bot.before_invoke
+async def profile_before(ctx):
+    ctx.profile_session = profiler.begin(ctx.command.qualified_name)
+
+@bot.after_invoke
+async def profile_after(ctx):
+    profiler.end(getattr(ctx, "profile_session", None))
+
 @bot.event
 async def on_ready():
-    await init_db()
+    global startup_done
+    await bot.change_presence(activity=random.choice(BOT_STATUSES))
+    if startup_done:
+        print(f'🔄 Ponovno povezan kot {bot.user}')
+        return
+    startup_done = True
+    await timed("čiščenje strežnikov", prune_guilds())
     if not check_deadlines.is_running():
         check_deadlines.start()
     if not rotate_status.is_running():
         rotate_status.start()
-    await bot.change_presence(activity=random.choice(BOT_STATUSES))
+    if not backup_database.is_running():
+        backup_database.start()
+    log_phase("zagon do on_ready", startup_t0)
     print(f'Prijavljen kot {bot.user}')
 
 # --- UKAZI ZA LASTNIKA (STRUKTURA JE GLOBALNA) ---
 @bot.command()
 @commands.is_owner()
 async def nova_smer(ctx, *, ime_smeri: str):
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        try:
-            await db.execute("INSERT INTO study_programs (name) VALUES (?)", (ime_smeri,))
-            await db.commit()
-            await ctx.send(f"✅ Dodana smer: **{ime_smeri}**")
-        except aiosqlite.IntegrityError:
-            await ctx.send("⚠️ Ta smer že obstaja.")
-        except Exception as e:
-            await ctx.send(f"⚠️ Napaka: {e}")
+    try:
+        await repo.add_program(ime_smeri)
+        await dispatcher.send(ctx, f"✅ Dodana smer: **{ime_smeri}**")
+    except aiosqlite.IntegrityError:
+        await dispatcher.send(ctx, "⚠️ Ta smer že obstaja.")
+    except Exception as e:
+        await dispatcher.send(ctx, f"⚠️ Napaka: {e}")
 
 @bot.command()
 @commands.is_owner()
 async def dodaj_letnik(ctx, ime_smeri: str, st_letnika: int):
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        cursor = await db.execute("SELECT id FROM study_programs WHERE name = ?", (ime_smeri,))
-        program = await cursor.fetchone()
-        if not program:
-            return await ctx.send(f"❌ Smer **{ime_smeri}** ne obstaja.")
-        await db.execute("INSERT INTO years (program_id, number) VALUES (?, ?)", (program[0], st_letnika))
-        await db.commit()
-        await ctx.send(f"✅ Dodan letnik {st_letnika}.")
+    program = await repo.program_by_name(ime_smeri)
+    if not program:
+        return await dispatcher.send(ctx, f"❌ Smer **{ime_smeri}** ne obstaja.")
+    await repo.add_year(program.id, st_letnika)
+    await dispatcher.send(ctx, f"✅ Dodan letnik {st_letnika}.")
 
 @bot.command()
 @commands.is_owner()
 async def dodaj_semester(ctx, ime_smeri: str, st_letnika: int, st_semestra: int):
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        query = "SELECT y.id FROM years y JOIN study_programs sp ON y.program_id = sp.id WHERE sp.name = ? AND y.number = ?"
-        cursor = await db.execute(query, (ime_smeri, st_letnika))
-        year = await cursor.fetchone()
-        if not year:
-            return await ctx.send(f"❌ Letnik {st_letnika} za smer **{ime_smeri}** ne obstaja.")
-        await db.execute("INSERT INTO semesters (year_id, number) VALUES (?, ?)", (year[0], st_semestra))
-        await db.commit()
-        await ctx.send("✅ Dodan semester.")
+    year = await repo.year_by_program_name(ime_smeri, st_letnika)
+    if not year:
+        return await dispatcher.send(ctx, f"❌ Letnik {st_letnika} za smer **{ime_smeri}** ne obstaja.")
+    await repo.add_semester(year.id, st_semestra)
+    await dispatcher.send(ctx, "✅ Dodan semester.")
 
 @bot.command()
 @commands.is_owner()
 async def dodaj_predmet(ctx, ime_smeri: str, st_letnika: int, st_semestra: int, ime_predmeta: str, kratica: str, ects: int):
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        query = """SELECT s.id FROM semesters s JOIN years y ON s.year_id = y.id JOIN study_programs sp ON y.program_id = sp.id 
-                   WHERE sp.name = ? AND y.number = ? AND s.number = ?"""
-        cursor = await db.execute(query, (ime_smeri, st_letnika, st_semestra))
-        semester = await cursor.fetchone()
-        if not semester:
-            return await ctx.send(f"❌ Semester {st_semestra} za letnik {st_letnika} v smeri **{ime_smeri}** ne obstaja.")
-        await db.execute("INSERT INTO subjects (semester_id, name, acronym, ects) VALUES (?, ?, ?, ?)", 
-                         (semester[0], ime_predmeta, kratica, ects))
-        await db.commit()
-        await ctx.send(f"✅ Dodan predmet {ime_predmeta}.")
+    semester = await repo.semester_by_program_name(ime_smeri, st_letnika, st_semestra)
+    if not semester:
+        return await dispatcher.send(ctx, f"❌ Semester {st_semestra} za letnik {st_letnika} v smeri **{ime_smeri}** ne obstaja.")
+    await repo.add_subject(semester.id, ime_predmeta, kratica, ects)
+    await dispatcher.send(ctx, f"✅ Dodan predmet {ime_predmeta}.")
 
 # --- ADMIN STREŽNIKA (DODAJANJE Z GUILD_ID) ---
 
@@ -469,88 +662,51 @@ async def dodaj_predmet(ctx, ime_smeri: str, st_letnika: int, st_semestra: int,
 @commands.has_permissions(administrator=True)
 async def dodaj_rok(ctx, kratica: str, tip: str, datum: str, *, opis: str):
     """Doda rok, viden samo na tem serverju."""
-    if tip.lower() not in ['vaje', 'kolokvij', 'izpit']: return await ctx.send("❌ Tip mora biti: Vaje, Kolokvij ali Izpit.")
+    if tip.lower() not in ['vaje', 'kolokvij', 'izpit']: return await dispatcher.send(ctx, "❌ Tip mora biti: Vaje, Kolokvij ali Izpit.")
     try:
         db_date = datetime.strptime(datum, "%d.%m.%Y").strftime("%Y-%m-%d")
-    except ValueError: return await ctx.send("❌ Napačen format (DD.MM.YYYY).")
-
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        config = await db.execute("SELECT current_program_id FROM server_config WHERE guild_id = ?", (ctx.guild.id,))
-        cfg = await config.fetchone()
-        if not cfg: return await ctx.send("⚠️ Bot ni nastavljen.")
-
-        cursor = await db.execute("""
-            SELECT sub.id, sub.name FROM subjects sub
-            JOIN semesters sem ON sub.semester_id = sem.id
-            JOIN years y ON sem.year_id = y.id
-            WHERE y.program_id = ? AND UPPER(sub.acronym) = ?
-        """, (cfg[0], kratica.upper()))
-        subj = await cursor.fetchone()
-        if not subj: return await ctx.send(f"❌ Predmet {kratica} ne obstaja v tej smeri.")
-
-        # SHRANIMO GUILD_ID
-        await db.execute("""
-            INSERT INTO deadlines (subject_id, guild_id, deadline_type, date_time, description) 
-            VALUES (?, ?, ?, ?, ?)
-        """, (subj[0], ctx.guild.id, tip.capitalize(), db_date, opis))
-        await db.commit()
-    await ctx.send(f"✅ Dodan rok: **{subj[1]}** - {tip} ({datum})")
+    except ValueError: return await dispatcher.send(ctx, "❌ Napačen format (DD.MM.YYYY).")
+
+    cfg = await repo.config(ctx.guild.id)
+    if not cfg: return await dispatcher.send(ctx, "⚠️ Bot ni nastavljen.")
+    subj = await repo.subject_by_acronym(cfg.program_id, kratica)
+    if not subj: return await dispatcher.send(ctx, f"❌ Predmet {kratica} ne obstaja v tej smeri.")
+
+    # SHRANIMO GUILD_ID
+    await repo.add_deadline(subj.id, ctx.guild.id, tip.capitalize(), db_date, opis)
+    await dispatcher.send(ctx, f"✅ Dodan rok: **{subj.name}** - {tip} ({datum})")
 
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def dodaj_gradivo(ctx, kratica: str, url: str, *, opis: str):
     """Doda gradivo, vidno samo na tem serverju."""
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        config = await db.execute("SELECT current_program_id FROM server_config WHERE guild_id = ?", (ctx.guild.id,))
-        cfg = await config.fetchone()
-        if not cfg: return await ctx.send("⚠️ Bot ni nastavljen.")
-
-        cursor = await db.execute("""
-            SELECT sub.id, sub.name FROM subjects sub
-            JOIN semesters sem ON sub.semester_id = sem.id
-            JOIN years y ON sem.year_id = y.id
-            WHERE y.program_id = ? AND UPPER(sub.acronym) = ?
-        """, (cfg[0], kratica.upper()))
-        subj = await cursor.fetchone()
-        if not subj:
-            return await ctx.send(f"❌ Predmet {kratica} ne obstaja v tej smeri.")
-        # SHRANIMO GUILD_ID
-        await db.execute("""
-            INSERT INTO materials (subject_id, guild_id, url, description, type) 
-            VALUES (?, ?, ?, ?, ?)
-        """, (subj[0], ctx.guild.id, url, opis, "Gradivo"))
-        await db.commit()
-        await ctx.send(f"✅ Gradivo dodano za **{subj[1]}**.")
+    cfg = await repo.config(ctx.guild.id)
+    if not cfg: return await dispatcher.send(ctx, "⚠️ Bot ni nastavljen.")
+    subj = await repo.subject_by_acronym(cfg.program_id, kratica)
+    if not subj:
+        return await dispatcher.send(ctx, f"❌ Predmet {kratica} ne obstaja v tej smeri.")
+    # SHRANIMO GUILD_ID
+    await repo.add_material(subj.id, ctx.guild.id, url, opis)
+    await dispatcher.send(ctx, f"✅ Gradivo dodano za **{subj.name}**.")
 
 # --- OSTALI UKAZI (SETUP, POSODOBI...) ---
 
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def setup(ctx):
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        cursor = await db.execute("SELECT id, name FROM study_programs")
-        smeri = await cursor.fetchall()
-        if not smeri: return await ctx.send("⚠️ Baza je prazna.")
-    options = [discord.SelectOption(label=name[:100], value=str(pid)) for pid, name in smeri]
+    smeri = await repo.programs()
+    if not smeri: return await dispatcher.send(ctx, "⚠️ Baza je prazna.")
+    options = [discord.SelectOption(label=p.name[:100], value=str(p.id)) for p in smeri]
     view = AuthorOnlyView(ctx.author)
     view.add_item(SetupSmerSelect(options))
-    await ctx.send("⚙️ **Začenjam Setup**\nIzberi smer študija za ta strežnik:", view=view)
+    await dispatcher.send(ctx, "⚙️ **Začenjam Setup**\nIzberi smer študija za ta strežnik:", view=view)
 
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def nastavitve(ctx):
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        cursor = await db.execute("""
-            SELECT sp.name, y.number, sem.number, sc.notification_channel_id 
-            FROM server_config sc
-            JOIN study_programs sp ON sc.current_program_id = sp.id
-            JOIN years y ON sc.current_year_id = y.id
-            JOIN semesters sem ON sc.current_semester_id = sem.id
-            WHERE sc.guild_id = ?
-        """, (ctx.guild.id,))
-        res = await cursor.fetchone()
-    if not res: return await ctx.send("⚠️ Bot ni konfiguriran.")
-    prog_name, year_num, sem_num, channel_id = res
+    res = await repo.config_overview(ctx.guild.id)
+    if not res: return await dispatcher.send(ctx, "⚠️ Bot ni konfiguriran.")
+    prog_name, year_num, sem_num, channel_id, digest_mode, digest_time, offsets = res
     channel_mention = f"<#{channel_id}>" if channel_id else "Ni nastavljen"
     sem_name = "Zimski" if sem_num == 1 else "Poletni"
     embed = discord.Embed(title="⚙️ Nastavitve Strežnika", color=discord.Color.blue())
@@ -558,49 +714,62 @@ async def nastavitve(ctx):
     embed.add_field(name="Letnik", value=f"{year_num}. letnik", inline=True)
     embed.add_field(name="Semester", value=sem_name, inline=True)
     embed.add_field(name="Kanal za obvestila", value=channel_mention, inline=False)
+    zamiki = ", ".join(str(o) for o in parse_offsets(offsets)) or "brez"
+    nacin = f"Dnevni povzetek ob {digest_time or DEFAULT_DIGEST_TIME}" if digest_mode else "Posamezna sporočila"
+    embed.add_field(name="Opomniki", value=f"{nacin}\nDnevi pred rokom: {zamiki}", inline=False)
     view = AuthorOnlyView(ctx.author)
     view.add_item(SettingsChannelSelect())
-    await ctx.send(embed=embed, view=view)
+    await dispatcher.send(ctx, embed=embed, view=view)
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def obvestila(ctx, nastavitev: str = None, *, vrednost: str = None):
+    """Nastavitve opomnikov: povzetek on/off, ura HH:MM, zamiki 7,3,1."""
+    nastavitev = (nastavitev or "").lower()
+    if nastavitev == "povzetek" and vrednost and vrednost.lower() in ("on", "off", "da", "ne"):
+        spremenjeno = await repo.set_digest_mode(ctx.guild.id, vrednost.lower() in ("on", "da"))
+    elif nastavitev == "ura" and vrednost:
+        try:
+            ura = datetime.strptime(vrednost.strip(), "%H:%M").strftime("%H:%M")
+        except ValueError: return await dispatcher.send(ctx, "❌ Napačen format ure (HH:MM).")
+        spremenjeno = await repo.set_digest_time(ctx.guild.id, ura)
+    elif nastavitev == "zamiki" and vrednost:
+        zamiki = parse_offsets(vrednost)
+        if not zamiki: return await dispatcher.send(ctx, "❌ Navedi dni pred rokom, npr. `7,3,1` (0-60).")
+        spremenjeno = await repo.set_offsets(ctx.guild.id, zamiki)
+    else:
+        return await dispatcher.send(ctx, "ℹ️ Uporaba:\n`!obvestila povzetek on|off`\n`!obvestila ura 08:00`\n`!obvestila zamiki 7,3,1`")
+
+    if spremenjeno == 0: return await dispatcher.send(ctx, "⚠️ Bot ni nastavljen.")
+    await dispatcher.send(ctx, "✅ Nastavitve opomnikov posodobljene. Trenutne nastavitve vidiš z `!nastavitve`.")
 
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def posodobi(ctx):
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        cursor = await db.execute("SELECT current_program_id FROM server_config WHERE guild_id = ?", (ctx.guild.id,))
-        config = await cursor.fetchone()
-        if not config: return await ctx.send("⚠️ Bot ni nastavljen.")
-        program_id = config[0]
-        cursor = await db.execute("SELECT id, number FROM years WHERE program_id = ? ORDER BY number ASC", (program_id,))
-        letniki = await cursor.fetchall()
-    if not letniki: return await ctx.send("⚠️ Napaka v bazi.")
-    options = [discord.SelectOption(label=f"{num}. letnik", value=str(lid)) for lid, num in letniki]
+    config = await repo.config(ctx.guild.id)
+    if not config: return await dispatcher.send(ctx, "⚠️ Bot ni nastavljen.")
+    letniki = await repo.years(config.program_id)
+    if not letniki: return await dispatcher.send(ctx, "⚠️ Napaka v bazi.")
     view = AuthorOnlyView(ctx.author)
-    view.add_item(AdminYearSelect(program_id, options))
-    await ctx.send("⚙️ **Posodobitev semestra**\nIzberi novi letnik:", view=view)
+    view.add_item(AdminYearSelect(config.program_id, year_options(letniki)))
+    await dispatcher.send(ctx, "⚙️ **Posodobitev semestra**\nIzberi novi letnik:", view=view)
 
 @bot.command()
 async def arhiv(ctx):
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        cursor = await db.execute("SELECT current_program_id FROM server_config WHERE guild_id = ?", (ctx.guild.id,))
-        config = await cursor.fetchone()
+    config = await repo.config(ctx.guild.id)
 
     if config:
-        prog_id = config[0]
-        async with aiosqlite.connect(DATABASE_NAME) as db:
-            cursor = await db.execute("SELECT id, number FROM years WHERE program_id = ? ORDER BY number ASC", (prog_id,))
-            letniki = await cursor.fetchall()
+        letniki = await repo.years(config.program_id)
         if not letniki:
-            return await ctx.send("⚠️ Ni letnikov za to smer.")
-        options = [discord.SelectOption(label=f"{n}. letnik", value=str(i)) for i, n in letniki]
+            return await dispatcher.send(ctx, "⚠️ Ni letnikov za to smer.")
         view = AuthorOnlyView(ctx.author)
-        view.add_item(LetnikSelect(prog_id, options))
-        return await ctx.send(f"📂 **Gradiva in roki**\n⬇️ Izberi letnik:", view=view)
+        view.add_item(LetnikSelect(config.program_id, year_options(letniki)))
+        return await dispatcher.send(ctx, f"📂 **Gradiva in roki**\n⬇️ Izberi letnik:", view=view)
 
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        smeri = await (await db.execute("SELECT id, name FROM study_programs")).fetchall()
+    smeri = await repo.programs()
 
     if not smeri:
-        return await ctx.send("⚠️ Baza je prazna.")
+        return await dispatcher.send(ctx, "⚠️ Baza je prazna.")
 
     class SmerSelectArhiv(Select):
         def __init__(self, opts):
@@ -608,38 +777,183 @@ async def arhiv(ctx):
 
         async def callback(self, interaction: discord.Interaction):
             prog_id = int(self.values[0])
-            async with aiosqlite.connect(DATABASE_NAME) as db:
-                letniki = await (await db.execute("SELECT id, number FROM years WHERE program_id=?", (prog_id,))).fetchall()
+            letniki = await repo.years(prog_id)
             if not letniki:
-                return await interaction.response.send_message("⚠️ Ni letnikov za to smer.", ephemeral=True)
+                return await dispatcher.respond(interaction, "⚠️ Ni letnikov za to smer.", ephemeral=True)
             view = AuthorOnlyView(interaction.user)
-            view.add_item(LetnikSelect(prog_id, [discord.SelectOption(label=f"{n}. letnik", value=str(x)) for x, n in letniki]))
-            await interaction.response.edit_message(content="⬇️ Izberi letnik:", view=view)
+            view.add_item(LetnikSelect(prog_id, year_options(letniki)))
+            await dispatcher.edit(interaction, content="⬇️ Izberi letnik:", view=view)
 
     view = AuthorOnlyView(ctx.author)
-    view.add_item(SmerSelectArhiv([discord.SelectOption(label=n[:100], value=str(i)) for i, n in smeri]))
-    await ctx.send("🗄️ **Arhiv (Splošni)**\nIzberi smer:", view=view)
+    view.add_item(SmerSelectArhiv([discord.SelectOption(label=p.name[:100], value=str(p.id)) for p in smeri]))
+    await dispatcher.send(ctx, "🗄️ **Arhiv (Splošni)**\nIzberi smer:", view=view)
 
 @bot.command()
 async def predmeti(ctx):
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        cursor = await db.execute("SELECT current_semester_id FROM server_config WHERE guild_id = ?", (ctx.guild.id,))
-        config = await cursor.fetchone()
-    
-    if not config: return await ctx.send("⚠️ Bot ni nastavljen.")
-    current_semester_id = config[0]
+    config = await repo.config(ctx.guild.id)
+    if not config: return await dispatcher.send(ctx, "⚠️ Bot ni nastavljen.")
 
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        cursor = await db.execute("SELECT id, name, acronym FROM subjects WHERE semester_id = ? ORDER BY name ASC", (current_semester_id,))
-        predmeti = await cursor.fetchall()
+    predmeti = await repo.subjects(config.semester_id)
+    if not predmeti: return await dispatcher.send(ctx, "📭 V trenutnem semestru ni predmetov.")
 
-    if not predmeti: return await ctx.send("📭 V trenutnem semestru ni predmetov.")
-
-    options = [discord.SelectOption(label=f"{name} ({acronym})"[:100], value=str(pid)) for pid, name, acronym in predmeti]
     view = AuthorOnlyView(ctx.author)
-    view.add_item(PredmetSelect(current_semester_id))
-    view.children[0].options = options
-    await ctx.send("📚 **Predmeti v tekočem semestru**\nIzberi predmet:", view=view)
+    view.add_item(PredmetSelect(config.semester_id))
+    view.children[0].options = subject_options(predmeti)
+    await dispatcher.send(ctx, "📚 **Predmeti v tekočem semestru**\nIzberi predmet:", view=view)
+
+@bot.command()
+async def koledar(ctx):
+    """Povezavi do koledarja rokov (.ics) za ta strežnik."""
+    if not await repo.config(ctx.guild.id): return await dispatcher.send(ctx, "⚠️ Bot ni nastavljen.")
+    secret = feeds.secret
+    embed = discord.Embed(title="📅 Koledar rokov", color=discord.Color.blue(),
+                          description="Povezavo dodaj v Google Calendar, Outlook ali Apple Koledar (\"naroči se na koledar\" / \"iz URL-ja\").")
+    embed.add_field(name="Vsi roki smeri", value=feed_url(secret, ctx.guild.id), inline=False)
+    embed.add_field(name="Samo tekoči semester", value=feed_url(secret, ctx.guild.id, "trenutni"), inline=False)
+    await dispatcher.send(ctx, embed=embed)
+
+@bot.command()
+@commands.is_owner()
+async def varnostna_kopija(ctx):
+    """Takoj ustvari varnostno kopijo baze in prikaže seznam kopij."""
+    try:
+        path = await asyncio.to_thread(backup.create_snapshot)
+    except Exception as e:
+        return await dispatcher.send(ctx, f"⚠️ Napaka pri kopiranju: {e}")
+    kopije = backup.list_snapshots()
+    seznam = "\n".join(f"`{name}` ({size // 1024} KB)" for name, size, _ in kopije[:10])
+    await dispatcher.send(ctx, f"💾 Ustvarjena kopija `{os.path.basename(path)}`.\n**Zadnje kopije:**\n{seznam}")
+
+@bot.command()
+@commands.is_owner()
+async def obnovi(ctx, ime_kopije: str):
+    """Obnovi bazo iz kopije (trenutno stanje se prej shrani)."""
+    try:
+        safety = await asyncio.to_thread(backup.restore_snapshot, ime_kopije)
+        await init_db() # Starejša kopija morda še nima novejših tabel/stolpcev
+        forget_cached_state()
+    except (ValueError, FileNotFoundError):
+        return await dispatcher.send(ctx, f"❌ Kopija `{ime_kopije}` ne obstaja.")
+    except Exception as e:
+        return await dispatcher.send(ctx, f"⚠️ Napaka pri obnovi: {e}")
+    await dispatcher.send(ctx, f"✅ Baza obnovljena iz `{ime_kopije}`.\nPrejšnje stanje je shranjeno kot `{os.path.basename(safety)}`.")
+
+@bot.command()
+@commands.is_owner()
+async def izvoz(ctx, tabela: str = None, *args):
+    """Izvoz gradiv, rokov ali predmetov v CSV/JSONL; filter: tu, streznik ID ali smer ID."""
+    args = [a.lower() for a in args]
+    fmt = next((a for a in args if a in export.FORMATS), "csv")
+    guild_id = program_id = None
+    try:
+        if "tu" in args:
+            if not ctx.guild: return await dispatcher.send(ctx, "⚠️ `tu` deluje samo na strežniku.")
+            guild_id = ctx.guild.id
+        if "streznik" in args:
+            guild_id = int(args[args.index("streznik") + 1])
+        if "smer" in args:
+            program_id = int(args[args.index("smer") + 1])
+    except (IndexError, ValueError):
+        tabela = None
+    if tabela not in export.TABLES:
+        return await dispatcher.send(ctx, f"ℹ️ Uporaba: `!izvoz {'|'.join(export.TABLES)} [{'|'.join(export.FORMATS)}] [tu|streznik ID|smer ID]`")
+
+    try:
+        path, vrstic = await asyncio.to_thread(export.export_to_file, tabela, fmt, guild_id, program_id)
+    except Exception as e:
+        return await dispatcher.send(ctx, f"⚠️ Napaka pri izvozu: {e}")
+    await send_file(ctx, f"📤 Izvoženih {vrstic} vrstic v `{os.path.basename(path)}`.", path)
+
+@bot.command()
+@commands.is_owner()
+async def statistika(ctx):
+    """Prikaže števce iz tabele stats (brez COUNT(*) po tabelah)."""
+    povzetek = await repo.stats_summary()
+
+    g = povzetek["global"]
+    b = povzetek["buckets"]
+    embed = discord.Embed(title="📊 Statistika", color=discord.Color.dark_grey())
+    embed.add_field(name="Skupaj", value=f"🎓 Smeri: {g.get('study_programs', 0)}\n📚 Predmeti: {g.get('subjects', 0)}\n📂 Gradiva: {g.get('materials', 0)}\n⏳ Roki: {g.get('deadlines', 0)}", inline=True)
+    embed.add_field(name="Roki", value=f"7 dni: {b['week']}\n30 dni: {b['month']}\nKasneje: {b['later']}\nPretekli: {b['past']}", inline=True)
+    if ctx.guild:
+        lokalno = povzetek["guild"].get(ctx.guild.id, {})
+        vidni = stats.visible_buckets(povzetek, ctx.guild.id)
+        embed.add_field(name="Ta strežnik", value=f"📂 Gradiva: {lokalno.get('materials', 0)}\n⏳ Roki: {lokalno.get('deadlines', 0)}\n🔜 V 7 dneh (vidni): {vidni['week']}", inline=True)
+    smeri = sorted(povzetek["program"].values(), key=lambda p: p.get("subjects", 0), reverse=True)[:10]
+    if smeri:
+        embed.add_field(name="Po smereh", value="\n".join(f"**{p['name']}**: {p.get('subjects', 0)} predmetov, {p.get('materials', 0)} gradiv, {p.get('deadlines', 0)} rokov" for p in smeri)[:1024], inline=False)
+    await dispatcher.send(ctx, embed=embed)
+
+@bot.command()
+@commands.is_owner()
+async def metrike(ctx):
+    """Prikaže stanje vrste odhodnih sporočil."""
+    st = dispatcher.stats()
+    embed = discord.Embed(title="📈 Metrike", color=discord.Color.dark_grey())
+    embed.add_field(name="Vrsta", value=f"Skupaj: {st['queue_depth']}\nInterakcije: {st['queue_interaction']}\nUkazi: {st['queue_command']}\nOpomniki: {st['queue_reminder']}", inline=True)
+    embed.add_field(name="Pošiljanje", value=f"Poslano: {st['sent']}\nZdruženo: {st['coalesced']}\nNapake: {st['failed']}\nV teku: {st['in_flight']}", inline=True)
+    embed.add_field(name="Čakanje v vrsti", value=f"povp. {st['wait_avg_ms']:.0f} ms\np50 {st['wait_p50_ms']:.0f} ms\np99 {st['wait_p99_ms']:.0f} ms\nmax {st['wait_max_ms']:.0f} ms", inline=True)
+    zanka = loop_monitor.stats()
+    blokada = f"\nzadnja {zanka['last_stall_ms']:.0f} ms: `{zanka['last_stall_where'] or '?'}`"[:300] if zanka['stalls'] else ""
+    embed.add_field(name="Zakasnitev zanke", value=f"p50 {zanka['lag_p50_ms']:.1f} ms\np99 {zanka['lag_p99_ms']:.1f} ms\nmax {zanka['lag_max_ms']:.0f} ms\nBlokad: {zanka['stalls']}{blokada}", inline=False)
+    embed.add_field(name="Koledar", value=f"Izrisov: {feeds.renders}\nPoslanih: {feeds.hits}\n304: {feeds.not_modified}", inline=True)
+    poizvedbe = sorted(repo.query_stats.items(), key=lambda q: q[1][1], reverse=True)[:8]
+    if poizvedbe:
+        embed.add_field(name="Poizvedbe (skupni čas)", value="\n".join(f"`{ime}` {n}× · {t * 1000:.0f} ms (povp. {t / n * 1000:.1f} ms)" for ime, (n, t) in poizvedbe), inline=False)
+    await dispatcher.send(ctx, embed=embed)
+
+PROFILE_TASKS = ("check_deadlines", "backup_database")
+
+def profile_components():
+    """Imena menijev (povratni klici v AuthorOnlyView), ki jih lahko cilja !profil ukaz."""
+    return {name for name, obj in globals().items()
+            if isinstance(obj, type) and issubclass(obj, discord.ui.Item) and obj.__module__ == __name__}
+
+async def report_profile(ctx, result):
+    path, povzetek = result
+    await send_file(ctx, f"🔬 Profil shranjen v `{os.path.basename(path)}`.\n```\n{povzetek[:1800]}\n```", path)
+
+async def finish_profile(ctx, session, timeout):
+    """Počaka na konec okna ali N izvajanj in pošlje povzetek."""
+    try:
+        await asyncio.wait_for(session.done.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    if profiler.session is not session: return # Ustavljen ročno z !profil stop
+    await report_profile(ctx, profiler.stop())
+
+@bot.command()
+@commands.is_owner()
+async def profil(ctx, akcija: str = None, *args):
+    """Profiliranje: okno SEKUNDE [vzorci|cprofile], ukaz IME [N] [cprofile|vzorci], stop."""
+    akcija = (akcija or "").lower()
+    nacin = next((a.lower() for a in args if a.lower() in prof.MODES), None)
+    stevila = [int(a) for a in args if a.isdigit()]
+    try:
+        if akcija == "okno" and stevila:
+            sekunde = min(stevila[0], prof.MAX_WINDOW_SECONDS)
+            session = profiler.start_window(sekunde, nacin or "vzorci")
+            timeout = sekunde
+        elif akcija == "ukaz" and args:
+            cilj = args[0]
+            if cilj not in PROFILE_TASKS and cilj not in profile_components() and bot.get_command(cilj) is None:
+                return await dispatcher.send(ctx, f"❌ Ukaz, meni ali opravilo `{cilj}` ne obstaja.")
+            if bot.get_command(cilj) is not None:
+                cilj = bot.get_command(cilj).qualified_name
+            session = profiler.start_invocations(cilj, min(stevila[0] if stevila else 1, prof.MAX_INVOCATIONS), nacin or "cprofile")
+            timeout = prof.MAX_WAIT_SECONDS
+        elif akcija == "stop":
+            result = profiler.stop()
+            if result is None: return await dispatcher.send(ctx, "ℹ️ Profil ne teče.")
+            return await report_profile(ctx, result)
+        else:
+            stanje = f"\nTrenutno: {profiler.session.describe()}" if profiler.session else ""
+            return await dispatcher.send(ctx, "ℹ️ Uporaba:\n`!profil okno 30 [vzorci|cprofile]`\n`!profil ukaz arhiv 5 [cprofile|vzorci]`\n"
+                                         f"`!profil ukaz check_deadlines`\n`!profil ukaz PredmetSelect 5`\n`!profil stop`\n{prof.INVOCATION_NOTE}{stanje}")
+    except RuntimeError as e:
+        return await dispatcher.send(ctx, f"⚠️ {e}")
+    bot.profile_task = asyncio.create_task(finish_profile(ctx, session, timeout))
+    await dispatcher.send(ctx, f"🔬 Profil vklopljen ({session.describe()}).")
 
 @bot.command()
 async def help(ctx):
@@ -652,6 +966,12 @@ async def help(ctx):
         embed.set_thumbnail(url=bot.user.avatar.url)
     view = AuthorOnlyView(ctx.author)
     view.add_item(HelpSelect())
-    await ctx.send(embed=embed, view=view)
-
-bot.run(TOKEN)
\ No newline at end of file
+    await dispatcher.send(ctx, embed=embed, view=view)
+
+if __name__ == "__main__":
+    if install_uvloop(): print("⚡ Uporabljam uvloop.")
+    # Shema in migracije tečejo enkrat, preden se bot sploh prijavi
+    start = time.perf_counter()
+    asyncio.run(init_db())
+    log_phase("shema in migracije", start)
+    bot.run(TOKEN)
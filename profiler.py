@@ -0,0 +1,233 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
+
+# --- PROFILIRANJE NA ZAHTEVO (!profil) ---
+# Ko profil ni vklopljen, je edini strošek preverjanje `self.session is None`
+# v kljukah ukazov in opravil. Dva načina:
+#   cprofile - deterministično, šteje vsak klic (natančno, a opazno počasneje)
+#   vzorci   - nit vsakih SAMPLE_INTERVAL s pogleda sklad glavne niti (skoraj brez vpliva)
+DATABASE_NAME = os.getenv('DATABASE_PATH', 'studij.db')
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(DATABASE_NAME)), 'profiles'))
+SAMPLE_INTERVAL = 0.005
+MAX_WINDOW_SECONDS = 600
+MAX_INVOCATIONS = 100
+MAX_WAIT_SECONDS = 3600 # Če se ukaz v tem času ne izvede dovoljkrat, se profil vseeno zaključi
+TOP_FUNCTIONS = 15
+
+MODES = ("cprofile", "vzorci")
+
+# Zajem "N izvajanj" je vklopljen od začetka do konca izvajanja, tudi med await; ker vse
+# teče v eni niti, se takrat zajame tudi delo drugih opravil v zanki (to velja za oba načina)
+INVOCATION_NOTE = "Opomba: med await so zajeta tudi druga opravila, ki so takrat tekla v zanki."
+
+# Okvirji, v katerih zanka asyncio samo čaka na dogodke (ne štejejo kot delo)
+_IDLE_FRAMES = {("selectors.py", "select"), ("base_events.py", "_run_once")}
+
+
+def _label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+
+
+class CProfileCollector:
+    suffix = ".prof"
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def resume(self):
+        self._profile.enable()
+
+    def pause(self):
+        self._profile.disable()
+
+    def summary(self, top=TOP_FUNCTIONS):
+        out = io.StringIO()
+        ps = pstats.Stats(self._profile, stream=out)
+        ps.strip_dirs().sort_stats("cumulative").print_stats(top)
+        # Glavo (seznam datotek, prazne vrstice) izpustimo, ostane tabela funkcij
+        lines = [line for line in out.getvalue().splitlines() if line.strip()]
+        start = next((i for i, line in enumerate(lines) if line.lstrip().startswith("ncalls")), 0)
+        return "\n".join(lines[start:])
+
+    def save(self, path):
+        self._profile.dump_stats(path)
+
+
+class SamplingCollector:
+    """Vzorčevalnik: beleži sklade glavne niti v ločeni niti (format za flamegraph/speedscope)."""
+    suffix = ".folded"
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.idle = 0
+        self._thread_id = threading.get_ident()
+        self._running = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profil-vzorci", daemon=True)
+        self._thread.start()
+
+    def resume(self):
+        self._running.set()
+
+    def pause(self):
+        self._running.clear()
+
+    def close(self):
+        self._stop.set()
+        self._running.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._running.wait()
+            if self._stop.is_set():
+                break
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self._record(frame)
+            time.sleep(self.interval)
+
+    def _record(self, frame):
+        self.samples += 1
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+            self.idle += 1
+            return
+        stack = []
+        while frame is not None:
+            stack.append(_label(frame.f_code))
+            frame = frame.f_back
+        self.stacks[";".join(reversed(stack))] += 1
+
+    def summary(self, top=TOP_FUNCTIONS):
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        busy = sum(self.stacks.values())
+        lines = [f"vzorcev: {self.samples}, aktivnih: {busy}, nedejavna zanka: {self.idle}",
+                 f"{'lastni %':>9} {'skupaj %':>9}  funkcija"]
+        for name, count in own.most_common(top):
+            lines.append(f"{count / busy * 100:9.1f} {total[name] / busy * 100:9.1f}  {name}")
+        return "\n".join(lines)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfileSession:
+    """En zajem: časovno okno (target None) ali naslednjih `remaining` izvajanj ukaza/opravila."""
+
+    def __init__(self, mode, target=None, remaining=0, seconds=0.0):
+        self.mode = mode
+        self.target = target
+        self.remaining = remaining
+        self.seconds = seconds
+        self.collector = CProfileCollector() if mode == "cprofile" else SamplingCollector()
+        self.active = 0
+        self.finished = 0
+        self.done = asyncio.Event()
+
+    def describe(self):
+        if self.target is None:
+            return f"{self.mode}, okno {self.seconds:g} s"
+        return f"{self.mode}, `{self.target}` ({self.finished}/{self.finished + self.remaining})"
+
+
+class Profiler:
+    def __init__(self, out_dir=PROFILE_DIR):
+        self.out_dir = out_dir
+        self.session = None
+
+    # --- VKLOP ---
+    def start_window(self, seconds, mode="vzorci"):
+        """Zajem vsega, kar se dogaja v glavni niti, naslednjih `seconds` sekund."""
+        session = self._begin_session(ProfileSession(mode, seconds=seconds))
+        session.collector.resume()
+        return session
+
+    def start_invocations(self, target, count, mode="cprofile"):
+        """Zajem naslednjih `count` izvajanj ukaza ali opravila z imenom `target`."""
+        return self._begin_session(ProfileSession(mode, target=target, remaining=count))
+
+    def _begin_session(self, session):
+        if self.session is not None:
+            raise RuntimeError(f"Profil že teče ({self.session.describe()}).")
+        self.session = session
+        return session
+
+    def stop(self):
+        """Ustavi zajem; vrne (pot do datoteke, povzetek) ali None, če profil ne teče."""
+        session, self.session = self.session, None
+        if session is None:
+            return None
+        session.collector.pause()
+        if isinstance(session.collector, SamplingCollector):
+            session.collector.close()
+        os.makedirs(self.out_dir, exist_ok=True)
+        name = f"profil-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{session.target or 'okno'}{session.collector.suffix}"
+        path = os.path.join(self.out_dir, name)
+        session.collector.save(path)
+        session.done.set()
+        summary = session.collector.summary()
+        return path, summary if session.target is None else f"{INVOCATION_NOTE}\n{summary}"
+
+    # --- KLJUKE ---
+    def section(self, name):
+        """Kontekst za eno izvajanje opravila; brez aktivnega profila ne naredi ničesar."""
+        if self.session is None:
+            return nullcontext()
+        return _Section(self, name)
+
+    def begin(self, name):
+        """Začetek izvajanja `name`; vrne sejo, če se izvajanje zajema, sicer None."""
+        session = self.session
+        if session is None or session.target != name or session.remaining <= 0:
+            return None
+        session.remaining -= 1
+        if session.active == 0:
+            session.collector.resume()
+        session.active += 1
+        return session
+
+    def end(self, session):
+        if session is None:
+            return
+        session.active -= 1
+        session.finished += 1
+        if session.active == 0:
+            session.collector.pause()
+            if session.remaining <= 0 and self.session is session:
+                session.done.set()
+
+
+class _Section:
+    __slots__ = ("profiler", "name", "session")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.session = None
+
+    def __enter__(self):
+        self.session = self.profiler.begin(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.end(self.session)
+        return False
@@ -0,0 +1,613 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections import namedtuple, defaultdict
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+import icalfeed
+import stats
+
+# --- DOSTOP DO PODATKOV ---
+# Vsa SQL koda bota (in skupni deli admin panela) je tukaj. Bot uporablja eno
+# dolgoživo povezavo, zato sqlite3 vsak stavek prevede samo enkrat
+# (cached_statements), vrstice pa pridejo kot kompaktni namedtuple-i.
+
+# --- TIPI VRSTIC (namedtuple nima __dict__, zato so majhne) ---
+Program = namedtuple("Program", "id name")
+Numbered = namedtuple("Numbered", "id number")  # letnik ali semester
+Subject = namedtuple("Subject", "id name acronym")
+SubjectDetail = namedtuple("SubjectDetail", "name acronym ects professor assistants")
+Material = namedtuple("Material", "description url")
+Deadline = namedtuple("Deadline", "deadline_type date_time description")
+ServerConfig = namedtuple("ServerConfig", "guild_id program_id year_id semester_id channel_id digest_mode digest_time reminder_offsets last_digest")
+ConfigOverview = namedtuple("ConfigOverview", "program_name year_number semester_number channel_id digest_mode digest_time reminder_offsets")
+NotifyConfig = namedtuple("NotifyConfig", "guild_id channel_id digest_mode digest_time reminder_offsets last_digest")
+DueDeadline = namedtuple("DueDeadline", "id deadline_type date_time description subject_name guild_id")
+FeedState = namedtuple("FeedState", "program_id program_name semester_id version")
+
+# --- SQL ---
+SQL_PROGRAMS = "SELECT id, name FROM study_programs ORDER BY name"
+SQL_PROGRAM_BY_NAME = "SELECT id, name FROM study_programs WHERE name = ?"
+SQL_YEARS = "SELECT id, number FROM years WHERE program_id = ? ORDER BY number ASC"
+SQL_SEMESTERS = "SELECT id, number FROM semesters WHERE year_id = ? ORDER BY number ASC"
+SQL_SUBJECTS = "SELECT id, name, acronym FROM subjects WHERE semester_id = ? ORDER BY name ASC"
+SQL_SUBJECT_DETAIL = "SELECT name, acronym, ects, professor, assistants FROM subjects WHERE id = ?"
+SQL_SUBJECT_BY_ACRONYM = """
+    SELECT sub.id, sub.name, sub.acronym FROM subjects sub
+    JOIN semesters sem ON sub.semester_id = sem.id
+    JOIN years y ON sem.year_id = y.id
+    WHERE y.program_id = ? AND UPPER(sub.acronym) = ?
+"""
+SQL_YEAR_BY_PROGRAM_NAME = "SELECT y.id, y.number FROM years y JOIN study_programs sp ON y.program_id = sp.id WHERE sp.name = ? AND y.number = ?"
+SQL_SEMESTER_BY_PROGRAM_NAME = """
+    SELECT s.id, s.number FROM semesters s JOIN years y ON s.year_id = y.id JOIN study_programs sp ON y.program_id = sp.id
+    WHERE sp.name = ? AND y.number = ? AND s.number = ?
+"""
+# Prikaži če se guild_id ujema ALI če je NULL (globalno gradivo/rok, ki ga doda owner)
+SQL_MATERIALS_FOR = """
+    SELECT description, url
+    FROM materials
+    WHERE subject_id = ? AND (guild_id = ? OR guild_id IS NULL)
+"""
+SQL_UPCOMING_FOR = """
+    SELECT deadline_type, date_time, description
+    FROM deadlines
+    WHERE subject_id = ? AND date_time >= ? AND (guild_id = ? OR guild_id IS NULL)
+    ORDER BY date_time ASC
+"""
+
+SQL_CONFIG = """
+    SELECT guild_id, current_program_id, current_year_id, current_semester_id, notification_channel_id,
+           digest_mode, digest_time, reminder_offsets, last_digest
+    FROM server_config WHERE guild_id = ?
+"""
+SQL_CONFIG_OVERVIEW = """
+    SELECT sp.name, y.number, sem.number, sc.notification_channel_id,
+           sc.digest_mode, sc.digest_time, sc.reminder_offsets
+    FROM server_config sc
+    JOIN study_programs sp ON sc.current_program_id = sp.id
+    JOIN years y ON sc.current_year_id = y.id
+    JOIN semesters sem ON sc.current_semester_id = sem.id
+    WHERE sc.guild_id = ?
+"""
+SQL_ALL_CONFIGS = SQL_CONFIG.replace("WHERE guild_id = ?", "")
+SQL_CONFIG_GUILDS = "SELECT guild_id, removed_at FROM server_config"
+SQL_NOTIFY_CONFIGS = """
+    SELECT guild_id, notification_channel_id, digest_mode, digest_time, reminder_offsets, last_digest
+    FROM server_config WHERE notification_channel_id IS NOT NULL
+"""
+SQL_SAVE_SETUP = """
+    INSERT INTO server_config (guild_id, current_program_id, current_year_id, current_semester_id, notification_channel_id)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(guild_id) DO UPDATE SET current_program_id = excluded.current_program_id,
+        current_year_id = excluded.current_year_id, current_semester_id = excluded.current_semester_id,
+        notification_channel_id = excluded.notification_channel_id
+"""
+SQL_SET_CHANNEL = "UPDATE server_config SET notification_channel_id = ? WHERE guild_id = ?"
+SQL_SET_SEMESTER = "UPDATE server_config SET current_program_id = ?, current_year_id = ?, current_semester_id = ? WHERE guild_id = ?"
+SQL_SET_DIGEST_MODE = "UPDATE server_config SET digest_mode = ? WHERE guild_id = ?"
+SQL_SET_DIGEST_TIME = "UPDATE server_config SET digest_time = ?, last_digest = NULL WHERE guild_id = ?"
+SQL_SET_OFFSETS = "UPDATE server_config SET reminder_offsets = ? WHERE guild_id = ?"
+SQL_SET_LAST_DIGEST = "UPDATE server_config SET last_digest = ? WHERE guild_id = ?"
+SQL_FORGET_CHANNEL = "UPDATE server_config SET notification_channel_id = NULL WHERE notification_channel_id = ? RETURNING guild_id"
+# Strežnik, s katerega je bot odstranjen, se le označi; podatki se izbrišejo po GUILD_RETENTION_DAYS
+SQL_MARK_GUILD_REMOVED = "UPDATE server_config SET removed_at = ? WHERE guild_id = ? AND removed_at IS NULL"
+SQL_MARK_GUILD_PRESENT = "UPDATE server_config SET removed_at = NULL WHERE guild_id = ? AND removed_at IS NOT NULL"
+SQL_EXPIRED_GUILDS = "SELECT guild_id FROM server_config WHERE removed_at IS NOT NULL AND removed_at <= ?"
+SQL_PURGE_GUILD = (
+    "DELETE FROM deadlines WHERE guild_id = ?",
+    "DELETE FROM materials WHERE guild_id = ?",
+    "DELETE FROM reminders_sent WHERE guild_id = ?",
+    "DELETE FROM server_config WHERE guild_id = ?",
+    "DELETE FROM feed_versions WHERE guild_id = ?", # Zadnji: brisanje rokov jo prek prožilca znova ustvari
+)
+
+SQL_ADD_PROGRAM = "INSERT INTO study_programs (name) VALUES (?)"
+SQL_ADD_YEAR = "INSERT INTO years (program_id, number) VALUES (?, ?)"
+SQL_ADD_SEMESTER = "INSERT INTO semesters (year_id, number) VALUES (?, ?)"
+SQL_ADD_SUBJECT = "INSERT INTO subjects (semester_id, name, acronym, professor, ects) VALUES (?, ?, ?, ?, ?)"
+SQL_ADD_DEADLINE = "INSERT INTO deadlines (subject_id, guild_id, deadline_type, date_time, description) VALUES (?, ?, ?, ?, ?)"
+SQL_ADD_MATERIAL = "INSERT INTO materials (subject_id, guild_id, url, description, type) VALUES (?, ?, ?, ?, ?)"
+
+SQL_SENT_REMINDERS = """
+    SELECT r.deadline_id, r.guild_id, r.offset_days FROM reminders_sent r
+    JOIN deadlines d ON r.deadline_id = d.id
+    WHERE d.date_time >= ? AND r.guild_id IN (SELECT value FROM json_each(?))
+"""
+SQL_DUE_DEADLINES = """
+    SELECT d.id, d.deadline_type, d.date_time, d.description, s.name, sc.guild_id
+    FROM deadlines d
+    JOIN subjects s ON d.subject_id = s.id
+    JOIN semesters sem ON s.semester_id = sem.id
+    JOIN server_config sc ON sc.current_semester_id = sem.id
+    WHERE d.date_time >= ? AND d.date_time <= DATE(?, '+' || ? || ' days')
+      AND (d.guild_id = sc.guild_id OR d.guild_id IS NULL)
+      AND sc.guild_id IN (SELECT value FROM json_each(?))
+"""
+# Koledar: različica se poveča ob vsaki spremembi rokov strežnika ali globalnih rokov (prožilci v icalfeed.py)
+SQL_FEED_STATE = """
+    SELECT sc.current_program_id, sp.name, sc.current_semester_id,
+           (SELECT COALESCE(SUM(version), 0) FROM feed_versions WHERE guild_id IN (sc.guild_id, 0))
+    FROM server_config sc JOIN study_programs sp ON sc.current_program_id = sp.id
+    WHERE sc.guild_id = ? AND sc.removed_at IS NULL
+"""
+SQL_FEED_DEADLINES = """
+    SELECT d.id, d.deadline_type, d.date_time, d.description, s.name, s.acronym
+    FROM deadlines d
+    JOIN subjects s ON d.subject_id = s.id
+    JOIN semesters sem ON s.semester_id = sem.id
+    JOIN years y ON sem.year_id = y.id
+    WHERE y.program_id = ? AND (d.guild_id = ? OR d.guild_id IS NULL) AND d.date_time >= ?
+      AND (? IS NULL OR sem.id = ?)
+    ORDER BY d.date_time ASC
+"""
+SQL_MARK_REMINDER = "INSERT OR IGNORE INTO reminders_sent (deadline_id, guild_id, offset_days) VALUES (?, ?, ?)"
+SQL_PRUNE_REMINDERS = "DELETE FROM reminders_sent WHERE deadline_id NOT IN (SELECT id FROM deadlines WHERE date_time >= ?)"
+
+# Kaskadno brisanje (uporablja ga admin panel)
+SQL_DELETE_SUBJECT = (
+    "DELETE FROM materials WHERE subject_id = ?",
+    "DELETE FROM deadlines WHERE subject_id = ?",
+    "DELETE FROM subjects WHERE id = ?",
+)
+SQL_DELETE_PROGRAM = (
+    "DELETE FROM materials WHERE subject_id IN (SELECT s.id FROM subjects s JOIN semesters sem ON s.semester_id = sem.id JOIN years y ON sem.year_id = y.id WHERE y.program_id = ?)",
+    "DELETE FROM deadlines WHERE subject_id IN (SELECT s.id FROM subjects s JOIN semesters sem ON s.semester_id = sem.id JOIN years y ON sem.year_id = y.id WHERE y.program_id = ?)",
+    "DELETE FROM subjects WHERE semester_id IN (SELECT sem.id FROM semesters sem JOIN years y ON sem.year_id = y.id WHERE y.program_id = ?)",
+    "DELETE FROM semesters WHERE year_id IN (SELECT id FROM years WHERE program_id = ?)",
+    "DELETE FROM years WHERE program_id = ?",
+    "DELETE FROM study_programs WHERE id = ?",
+)
+
+
+# Kako pogosto (s) preverimo, ali je bazo spremenil drug proces (admin panel, obnova iz kopije)
+CHANGE_CHECK_INTERVAL = 1.0
+
+
+def _id_list(ids):
+    # Seznam id-jev kot en parameter (json_each): besedilo poizvedbe je vedno enako, zato
+    # ostane v cached_statements, in ni omejitve števila parametrov
+    return json.dumps(list(ids))
+
+
+class Repository:
+    """Asinhroni dostop do baze za bota: ena povezava, predpomnjeni stavki, merjenje poizvedb."""
+
+    def __init__(self, path, cached_statements=256):
+        self.path = path
+        self.cached_statements = cached_statements
+        self._db = None
+        self._write_lock = None
+        # ime poizvedbe -> [število klicev, skupni čas v sekundah]
+        self.query_stats = defaultdict(lambda: [0, 0.0])
+        # Predpomnilnika: guild_id -> ServerConfig ali None in (poizvedba, id) -> vrstice kataloga.
+        # Lastna pisanja ju razveljavijo sproti; pisanja drugih povezav (admin panel, obnova
+        # iz kopije) zazna sync() prek PRAGMA data_version in ju izprazni.
+        self._configs = {}
+        self._catalog = {}
+        self._gen = 0 # Poveča se ob vsaki razveljavitvi (branje, ki je teklo med pisanjem, se ne shrani)
+        self._data_version = None
+        self._checked = 0.0
+        self.on_external_change = None # Klic brez argumentov, ko drug proces spremeni bazo
+
+    # --- ŽIVLJENJSKI CIKEL ---
+    async def open(self):
+        if self._db is None:
+            self._db = await aiosqlite.connect(self.path, cached_statements=self.cached_statements)
+            self._write_lock = asyncio.Lock()
+            self._data_version = await self._read_data_version()
+            self._checked = time.monotonic()
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Zaporedje pisanj, ki se potrdi skupaj (druga pisanja medtem čakajo)."""
+        async with self._write_lock:
+            try:
+                yield self
+                await self._db.commit()
+            except BaseException:
+                await self._db.rollback()
+                raise
+
+    def clear_cache(self):
+        self._gen += 1
+        self._configs.clear()
+        self._catalog.clear()
+
+    def _forget_config(self, guild_id=None):
+        self._gen += 1
+        if guild_id is None:
+            self._configs.clear()
+        else:
+            self._configs.pop(guild_id, None)
+
+    def _forget_catalog(self):
+        self._gen += 1
+        self._catalog.clear()
+
+    async def _read_data_version(self):
+        cursor = await self._db.execute("PRAGMA data_version")
+        return (await cursor.fetchone())[0]
+
+    async def sync(self):
+        """Če je bazo medtem spremenila druga povezava, pozabi predpomnilnike; vrne True ob spremembi.
+
+        data_version se spremeni samo ob potrditvah drugih povezav, zato lastna pisanja
+        bota ne praznijo predpomnilnikov. Preverja se največ enkrat na CHANGE_CHECK_INTERVAL.
+        """
+        now = time.monotonic()
+        if now - self._checked < CHANGE_CHECK_INTERVAL:
+            return False
+        self._checked = now
+        version = await self._read_data_version()
+        if version == self._data_version:
+            return False
+        self._data_version = version
+        self.clear_cache()
+        if self.on_external_change is not None:
+            self.on_external_change()
+        return True
+
+    # --- OGREVANJE OB ZAGONU ---
+    async def warm_configs(self):
+        """Naloži nastavitve vseh strežnikov v predpomnilnik; vrne jih kot seznam."""
+        gen = self._gen
+        configs = await self._fetchall("warm_configs", SQL_ALL_CONFIGS, row=ServerConfig)
+        if gen == self._gen:
+            self._configs.update((cfg.guild_id, cfg) for cfg in configs)
+        return configs
+
+    async def warm_catalog(self):
+        """Napolni predpomnilnik kataloga (smeri, letniki, semestri, predmeti), ki ga berejo meniji."""
+        for program in await self.programs():
+            for year in await self.years(program.id):
+                for semester in await self.semesters(year.id):
+                    await self.subjects(semester.id)
+
+    # --- POMOŽNO ---
+    async def _execute(self, name, sql, params=()):
+        start = time.perf_counter()
+        try:
+            return await self._db.execute(sql, params)
+        finally:
+            entry = self.query_stats[name]
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+
+    async def _fetchall(self, name, sql, params=(), row=None):
+        cursor = await self._execute(name, sql, params)
+        rows = await cursor.fetchall()
+        return [row._make(r) for r in rows] if row else rows
+
+    async def _fetchone(self, name, sql, params=(), row=None):
+        cursor = await self._execute(name, sql, params)
+        r = await cursor.fetchone()
+        return row._make(r) if (row and r is not None) else r
+
+    async def _cached(self, name, sql, param, row):
+        """Branje kataloga skozi predpomnilnik (katalog se spreminja redko, meniji ga berejo ves čas)."""
+        await self.sync()
+        key = (name, param)
+        rows = self._catalog.get(key)
+        if rows is not None:
+            self.query_stats["katalog (predpomnilnik)"][0] += 1
+            return rows
+        gen = self._gen
+        rows = tuple(await self._fetchall(name, sql, () if param is None else (param,), row))
+        if gen == self._gen:
+            self._catalog[key] = rows
+        return rows
+
+    async def _write(self, name, sql, params=()):
+        async with self.transaction():
+            cursor = await self._execute(name, sql, params)
+            return cursor.rowcount
+
+    # --- KATALOG (GLOBALNO) ---
+    async def programs(self):
+        return await self._cached("programs", SQL_PROGRAMS, None, Program)
+
+    async def program_by_name(self, name):
+        return await self._fetchone("program_by_name", SQL_PROGRAM_BY_NAME, (name,), Program)
+
+    async def years(self, program_id):
+        return await self._cached("years", SQL_YEARS, program_id, Numbered)
+
+    async def semesters(self, year_id):
+        return await self._cached("semesters", SQL_SEMESTERS, year_id, Numbered)
+
+    async def subjects(self, semester_id):
+        return await self._cached("subjects", SQL_SUBJECTS, semester_id, Subject)
+
+    async def subject_detail(self, subject_id):
+        return await self._fetchone("subject_detail", SQL_SUBJECT_DETAIL, (subject_id,), SubjectDetail)
+
+    async def subject_by_acronym(self, program_id, acronym):
+        return await self._fetchone("subject_by_acronym", SQL_SUBJECT_BY_ACRONYM, (program_id, acronym.upper()), Subject)
+
+    async def year_by_program_name(self, program_name, year_number):
+        return await self._fetchone("year_by_program_name", SQL_YEAR_BY_PROGRAM_NAME, (program_name, year_number), Numbered)
+
+    async def semester_by_program_name(self, program_name, year_number, semester_number):
+        return await self._fetchone("semester_by_program_name", SQL_SEMESTER_BY_PROGRAM_NAME,
+                                    (program_name, year_number, semester_number), Numbered)
+
+    async def add_program(self, name):
+        try:
+            return await self._write("add_program", SQL_ADD_PROGRAM, (name,))
+        finally:
+            self._forget_catalog()
+
+    async def add_year(self, program_id, number):
+        try:
+            return await self._write("add_year", SQL_ADD_YEAR, (program_id, number))
+        finally:
+            self._forget_catalog()
+
+    async def add_semester(self, year_id, number):
+        try:
+            return await self._write("add_semester", SQL_ADD_SEMESTER, (year_id, number))
+        finally:
+            self._forget_catalog()
+
+    async def add_subject(self, semester_id, name, acronym, ects, professor=None):
+        try:
+            return await self._write("add_subject", SQL_ADD_SUBJECT, (semester_id, name, acronym, professor, ects))
+        finally:
+            self._forget_catalog()
+
+    # --- GRADIVA IN ROKI (LOKALNO) ---
+    async def materials_for(self, subject_id, guild_id):
+        return await self._fetchall("materials_for", SQL_MATERIALS_FOR, (subject_id, guild_id), Material)
+
+    async def upcoming_for(self, subject_id, guild_id, today):
+        return await self._fetchall("upcoming_for", SQL_UPCOMING_FOR, (subject_id, today, guild_id), Deadline)
+
+    async def add_deadline(self, subject_id, guild_id, deadline_type, date, description):
+        return await self._write("add_deadline", SQL_ADD_DEADLINE, (subject_id, guild_id, deadline_type, date, description))
+
+    async def add_material(self, subject_id, guild_id, url, description, kind="Gradivo"):
+        return await self._write("add_material", SQL_ADD_MATERIAL, (subject_id, guild_id, url, description, kind))
+
+    # --- NASTAVITVE STREŽNIKA ---
+    async def config(self, guild_id):
+        await self.sync()
+        if guild_id in self._configs:
+            self.query_stats["config (predpomnilnik)"][0] += 1
+            return self._configs[guild_id]
+        gen = self._gen
+        cfg = await self._fetchone("config", SQL_CONFIG, (guild_id,), ServerConfig)
+        if gen == self._gen:
+            self._configs[guild_id] = cfg
+        return cfg
+
+    async def config_overview(self, guild_id):
+        return await self._fetchone("config_overview", SQL_CONFIG_OVERVIEW, (guild_id,), ConfigOverview)
+
+    async def config_guilds(self):
+        """{guild_id: removed_at} za vse nastavljene strežnike (removed_at je None za aktivne)."""
+        return dict(await self._fetchall("config_guilds", SQL_CONFIG_GUILDS))
+
+    async def notify_configs(self):
+        return await self._fetchall("notify_configs", SQL_NOTIFY_CONFIGS, row=NotifyConfig)
+
+    async def save_setup(self, guild_id, program_id, year_id, semester_id, channel_id):
+        changed = await self._write("save_setup", SQL_SAVE_SETUP, (guild_id, program_id, year_id, semester_id, channel_id))
+        self._forget_config(guild_id)
+        return changed
+
+    async def set_channel(self, guild_id, channel_id):
+        changed = await self._write("set_channel", SQL_SET_CHANNEL, (channel_id, guild_id))
+        self._forget_config(guild_id)
+        return changed
+
+    async def set_semester(self, guild_id, program_id, year_id, semester_id):
+        changed = await self._write("set_semester", SQL_SET_SEMESTER, (program_id, year_id, semester_id, guild_id))
+        self._forget_config(guild_id)
+        return changed
+
+    async def set_digest_mode(self, guild_id, enabled):
+        changed = await self._write("set_digest_mode", SQL_SET_DIGEST_MODE, (int(enabled), guild_id))
+        self._forget_config(guild_id)
+        return changed
+
+    async def set_digest_time(self, guild_id, hhmm):
+        changed = await self._write("set_digest_time", SQL_SET_DIGEST_TIME, (hhmm, guild_id))
+        self._forget_config(guild_id)
+        return changed
+
+    async def set_offsets(self, guild_id, offsets):
+        changed = await self._write("set_offsets", SQL_SET_OFFSETS, (",".join(map(str, offsets)), guild_id))
+        self._forget_config(guild_id)
+        return changed
+
+    async def forget_channel(self, channel_id):
+        """Odklopi kanal za obvestila; vrne id-je strežnikov, ki so ga imeli nastavljenega."""
+        async with self.transaction():
+            cursor = await self._execute("forget_channel", SQL_FORGET_CHANNEL, (channel_id,))
+            guild_ids = [guild_id for (guild_id,) in await cursor.fetchall()]
+        for guild_id in guild_ids:
+            self._forget_config(guild_id)
+        return guild_ids
+
+    async def mark_guild_removed(self, guild_id, day):
+        return await self._write("mark_guild_removed", SQL_MARK_GUILD_REMOVED, (day, guild_id))
+
+    async def mark_guild_present(self, guild_id):
+        return await self._write("mark_guild_present", SQL_MARK_GUILD_PRESENT, (guild_id,))
+
+    async def expired_guilds(self, before):
+        return [gid for (gid,) in await self._fetchall("expired_guilds", SQL_EXPIRED_GUILDS, (before,))]
+
+    async def purge_guild(self, guild_id):
+        async with self.transaction():
+            for sql in SQL_PURGE_GUILD:
+                await self._execute("purge_guild", sql, (guild_id,))
+        self._forget_config(guild_id)
+
+    # --- OPOMNIKI ---
+    async def due_deadlines(self, today, max_offset, guild_ids):
+        return await self._fetchall("due_deadlines", SQL_DUE_DEADLINES, (today, today, max_offset, _id_list(guild_ids)), DueDeadline)
+
+    async def sent_reminders(self, today, guild_ids):
+        return set(await self._fetchall("sent_reminders", SQL_SENT_REMINDERS, (today, _id_list(guild_ids))))
+
+    async def mark_reminders_sent(self, keys, digest_guilds, today):
+        """Zabeleži poslane opomnike (deadline_id, guild_id, offset) in dneve poslanih povzetkov."""
+        async with self.transaction():
+            start = time.perf_counter()
+            await self._db.executemany(SQL_MARK_REMINDER, keys)
+            await self._db.executemany(SQL_SET_LAST_DIGEST, [(today, gid) for gid in digest_guilds])
+            entry = self.query_stats["mark_reminders_sent"]
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+        for gid in digest_guilds:
+            self._forget_config(gid)
+
+    async def prune_reminders(self, today):
+        return await self._write("prune_reminders", SQL_PRUNE_REMINDERS, (today,))
+
+    # --- KOLEDAR ---
+    async def feed_state(self, guild_id):
+        return await self._fetchone("feed_state", SQL_FEED_STATE, (guild_id,), FeedState)
+
+    async def feed_deadlines(self, guild_id, program_id, semester_id, since):
+        return await self._fetchall("feed_deadlines", SQL_FEED_DEADLINES, (program_id, guild_id, since, semester_id, semester_id))
+
+    # --- STATISTIKA ---
+    async def stats_summary(self):
+        return stats.summarize(await self._fetchall("stats_snapshot", stats.SNAPSHOT_QUERY))
+
+
+# --- SHEMA (sqlite3; bot jo kliče prek to_thread) ---
+def init_schema(path):
+    """Ustvari tabele, izvede migracije starejših baz in namesti prožilce (idempotentno).
+
+    Kliče se ob zagonu bota in po vsaki obnovi iz kopije (v botu in v admin panelu),
+    ker je starejša kopija morda še brez novejših tabel, stolpcev ali prožilcev.
+    """
+    db = sqlite3.connect(path)
+    try:
+        # Globalne tabele (enake za vse)
+        db.execute("CREATE TABLE IF NOT EXISTS study_programs (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE)")
+        db.execute("CREATE TABLE IF NOT EXISTS years (id INTEGER PRIMARY KEY AUTOINCREMENT, program_id INTEGER, number INTEGER, FOREIGN KEY(program_id) REFERENCES study_programs(id))")
+        db.execute("CREATE TABLE IF NOT EXISTS semesters (id INTEGER PRIMARY KEY AUTOINCREMENT, year_id INTEGER, number INTEGER, FOREIGN KEY(year_id) REFERENCES years(id))")
+        db.execute("CREATE TABLE IF NOT EXISTS subjects (id INTEGER PRIMARY KEY AUTOINCREMENT, semester_id INTEGER, name TEXT NOT NULL, acronym TEXT, professor TEXT, assistants TEXT, ects INTEGER, FOREIGN KEY(semester_id) REFERENCES semesters(id))")
+    
+        # Lokalne tabele (vsebujejo guild_id)
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS materials (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, 
+                subject_id INTEGER, 
+                guild_id INTEGER, -- <--- VARNOST: ID strežnika
+                url TEXT NOT NULL, 
+                description TEXT, 
+                type TEXT, 
+                FOREIGN KEY(subject_id) REFERENCES subjects(id)
+            )
+        """)
+    
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS server_config (
+                guild_id INTEGER PRIMARY KEY,
+                current_program_id INTEGER,
+                current_year_id INTEGER,
+                current_semester_id INTEGER,
+                notification_channel_id INTEGER,
+                digest_mode BOOLEAN DEFAULT 0,
+                digest_time TEXT DEFAULT '08:00',
+                reminder_offsets TEXT DEFAULT '7,1',
+                last_digest TEXT,
+                removed_at TEXT -- Dan, ko je bil bot odstranjen s strežnika (NULL = aktiven)
+            )
+        """)
+        # Migracija starejših baz (stolpci za povzetek, zamike opomnikov in odstranitev)
+        cursor = db.execute("PRAGMA table_info(server_config)")
+        stolpci = {row[1] for row in cursor.fetchall()}
+        for stolpec, ddl in (("digest_mode", "BOOLEAN DEFAULT 0"), ("digest_time", "TEXT DEFAULT '08:00'"),
+                             ("reminder_offsets", "TEXT DEFAULT '7,1'"), ("last_digest", "TEXT"), ("removed_at", "TEXT")):
+            if stolpec not in stolpci:
+                db.execute(f"ALTER TABLE server_config ADD COLUMN {stolpec} {ddl}")
+    
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS deadlines (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                subject_id INTEGER,
+                guild_id INTEGER, -- <--- VARNOST: ID strežnika
+                deadline_type TEXT,
+                date_time TEXT,
+                description TEXT,
+                sent_week BOOLEAN DEFAULT 0,
+                sent_day BOOLEAN DEFAULT 0,
+                FOREIGN KEY(subject_id) REFERENCES subjects(id)
+            )
+        """)
+
+        # Poslani opomniki po strežniku in zamiku (nadomešča sent_week/sent_day, ki veljata za vse strežnike)
+        cursor = db.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='reminders_sent'")
+        reminders_missing = cursor.fetchone() is None
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS reminders_sent (
+                deadline_id INTEGER,
+                guild_id INTEGER,
+                offset_days INTEGER,
+                PRIMARY KEY (deadline_id, guild_id, offset_days)
+            )
+        """)
+        if reminders_missing:
+            for flag, offset in (("sent_week", 7), ("sent_day", 1)):
+                db.execute(f"""
+                    INSERT OR IGNORE INTO reminders_sent (deadline_id, guild_id, offset_days)
+                    SELECT d.id, sc.guild_id, {offset} FROM deadlines d
+                    JOIN server_config sc ON (d.guild_id = sc.guild_id OR d.guild_id IS NULL)
+                    WHERE d.{flag} = 1
+                """)
+
+        # Statistika s prožilci; ob prvi namestitvi (ali novih prožilcih) jo napolnimo iz obstoječih podatkov
+        cursor = db.execute("SELECT 1 FROM sqlite_master WHERE type='trigger' AND name = ?", (stats.REBUILD_MARKER,))
+        stats_missing = cursor.fetchone() is None
+        for stmt in stats.SCHEMA:
+            db.execute(stmt)
+        if stats_missing:
+            for stmt in stats.REBUILD:
+                db.execute(stmt)
+        # Različice za predpomnilnik koledarjev
+        for stmt in icalfeed.SCHEMA:
+            db.execute(stmt)
+        db.commit()
+    finally:
+        db.close()
+
+
+# --- SINHRONE FUNKCIJE ZA ADMIN PANEL (sqlite3) ---
+def delete_subject(conn: sqlite3.Connection, subject_id):
+    """Izbriše predmet z gradivi in roki v eni transakciji."""
+    for sql in SQL_DELETE_SUBJECT:
+        conn.execute(sql, (subject_id,))
+    conn.commit()
+
+
+def delete_program(conn: sqlite3.Connection, program_id):
+    """Izbriše smer in VSE, kar spada zraven (letnike, semestre, predmete, roke, gradiva)."""
+    for sql in SQL_DELETE_PROGRAM:
+        conn.execute(sql, (program_id,))
+    conn.commit()
+
+
+def create_program(conn: sqlite3.Connection, name, years):
+    """Ustvari smer z `years` letniki in po dvema semestroma na letnik."""
+    cur = conn.execute(SQL_ADD_PROGRAM, (name,))
+    program_id = cur.lastrowid
+    for i in range(1, years + 1):
+        year_id = conn.execute(SQL_ADD_YEAR, (program_id, i)).lastrowid
+        conn.executemany(SQL_ADD_SEMESTER, [(year_id, 1), (year_id, 2)])
+    conn.commit()
+    return program_id
@@ -0,0 +1,170 @@
+# --- STATISTIKA (VZDRŽUJEJO JO SQLITE PROŽILCI) ---
+# Števci se posodabljajo ob vsakem INSERT/UPDATE/DELETE, zato nadzorna plošča in
+# ukaz !statistika bereta eno majhno tabelo namesto COUNT(*) po celih tabelah.
+#
+#   stats               (scope, scope_id, entity) -> count
+#                       scope: 'global' (scope_id 0), 'guild' (0 = globalni vnosi), 'program'
+#   stats_deadline_days (guild_id, day) -> count; iz tega se sproti izračunajo
+#                       časovna okna rokov (pretekli, 7 dni, 30 dni, kasneje)
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS stats (
+        scope TEXT NOT NULL,
+        scope_id INTEGER NOT NULL,
+        entity TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (scope, scope_id, entity)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stats_deadline_days (
+        guild_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, day)
+    )
+    """,
+]
+
+_UPSERT = " ON CONFLICT(scope, scope_id, entity) DO UPDATE SET count = count + excluded.count;"
+_PROGRAM_OF_SUBJECT = """
+        FROM subjects s JOIN semesters sem ON s.semester_id = sem.id JOIN years y ON sem.year_id = y.id
+        WHERE s.id = {row}.subject_id"""
+
+
+def _bumps(table, row, delta):
+    """Stavki, ki jih prožilec za `table` izvede ob vstavljanju (+1) ali brisanju (-1)."""
+    stmts = [f"INSERT INTO stats (scope, scope_id, entity, count) VALUES ('global', 0, '{table}', {delta})" + _UPSERT]
+    if table in ("materials", "deadlines"):
+        stmts.append(f"INSERT INTO stats (scope, scope_id, entity, count) VALUES ('guild', COALESCE({row}.guild_id, 0), '{table}', {delta})" + _UPSERT)
+        stmts.append(f"INSERT INTO stats (scope, scope_id, entity, count) SELECT 'program', y.program_id, '{table}', {delta}"
+                     + _PROGRAM_OF_SUBJECT.format(row=row) + _UPSERT)
+    if table == "subjects":
+        stmts.append(f"""INSERT INTO stats (scope, scope_id, entity, count) SELECT 'program', y.program_id, 'subjects', {delta}
+        FROM semesters sem JOIN years y ON sem.year_id = y.id
+        WHERE sem.id = {row}.semester_id""" + _UPSERT)
+    if table == "deadlines":
+        stmts.append(f"""INSERT INTO stats_deadline_days (guild_id, day, count)
+        SELECT COALESCE({row}.guild_id, 0), {row}.date_time, {delta} WHERE {row}.date_time IS NOT NULL
+        ON CONFLICT(guild_id, day) DO UPDATE SET count = count + excluded.count;""")
+    return "\n        ".join(stmts)
+
+
+def _move_subject(row, sign):
+    """Predmet v drugi smeri s seboj odnese tudi števce svojih gradiv in rokov."""
+    return "\n        ".join(f"""INSERT INTO stats (scope, scope_id, entity, count)
+        SELECT 'program', y.program_id, '{entity}', {sign}(SELECT COUNT(*) FROM {entity} WHERE subject_id = NEW.id)
+        FROM semesters sem JOIN years y ON sem.year_id = y.id WHERE sem.id = {row}.semester_id""" + _UPSERT
+                            for entity in ("materials", "deadlines"))
+
+
+TRIGGERS = []
+for _table in ("study_programs", "subjects", "materials", "deadlines"):
+    TRIGGERS.append(f"""
+    CREATE TRIGGER IF NOT EXISTS stats_{_table}_ai AFTER INSERT ON {_table} BEGIN
+        {_bumps(_table, "NEW", 1)}
+    END""")
+    TRIGGERS.append(f"""
+    CREATE TRIGGER IF NOT EXISTS stats_{_table}_ad AFTER DELETE ON {_table} BEGIN
+        {_bumps(_table, "OLD", -1)}
+    END""")
+# Sprememba stolpcev, od katerih so odvisni števci: staro vrstico odštejemo, novo prištejemo
+_UPDATE_COLUMNS = {
+    "subjects": ("semester_id",),
+    "materials": ("subject_id", "guild_id"),
+    "deadlines": ("subject_id", "guild_id", "date_time"),
+}
+for _table, _columns in _UPDATE_COLUMNS.items():
+    TRIGGERS.append(f"""
+    CREATE TRIGGER IF NOT EXISTS stats_{_table}_au AFTER UPDATE OF {", ".join(_columns)} ON {_table}
+    WHEN {" OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in _columns)} BEGIN
+        {_bumps(_table, "OLD", -1)}
+        {_bumps(_table, "NEW", 1)}
+    END""")
+TRIGGERS.append(f"""
+    CREATE TRIGGER IF NOT EXISTS stats_subjects_move AFTER UPDATE OF semester_id ON subjects
+    WHEN OLD.semester_id IS NOT NEW.semester_id BEGIN
+        {_move_subject("OLD", "-")}
+        {_move_subject("NEW", "")}
+    END""")
+# Števci izbrisane smeri bi sicer ostali (z oznako None)
+TRIGGERS.append("""
+    CREATE TRIGGER IF NOT EXISTS stats_study_programs_cleanup AFTER DELETE ON study_programs BEGIN
+        DELETE FROM stats WHERE scope = 'program' AND scope_id = OLD.id;
+    END""")
+# Dnevi brez rokov se sproti počistijo, da tabela ostane majhna
+TRIGGERS.append("""
+    CREATE TRIGGER IF NOT EXISTS stats_deadline_days_cleanup AFTER UPDATE ON stats_deadline_days
+    WHEN NEW.count <= 0 BEGIN
+        DELETE FROM stats_deadline_days WHERE guild_id = NEW.guild_id AND day = NEW.day;
+    END""")
+
+SCHEMA = TABLES + TRIGGERS
+REBUILD_MARKER = "stats_deadlines_au" # Če tega prožilca še ni, se števci preračunajo
+
+# Polno preračunavanje; uporabi se ob prvi namestitvi in ob namestitvi prožilcev za UPDATE
+# (števci so se pred tem lahko razšli s podatki)
+REBUILD = [
+    "DELETE FROM stats",
+    "DELETE FROM stats_deadline_days",
+    "INSERT INTO stats SELECT 'global', 0, 'study_programs', COUNT(*) FROM study_programs",
+    "INSERT INTO stats SELECT 'global', 0, 'subjects', COUNT(*) FROM subjects",
+    "INSERT INTO stats SELECT 'global', 0, 'materials', COUNT(*) FROM materials",
+    "INSERT INTO stats SELECT 'global', 0, 'deadlines', COUNT(*) FROM deadlines",
+    "INSERT INTO stats SELECT 'guild', COALESCE(guild_id, 0), 'materials', COUNT(*) FROM materials GROUP BY 2",
+    "INSERT INTO stats SELECT 'guild', COALESCE(guild_id, 0), 'deadlines', COUNT(*) FROM deadlines GROUP BY 2",
+    """INSERT INTO stats SELECT 'program', y.program_id, 'subjects', COUNT(*)
+       FROM subjects s JOIN semesters sem ON s.semester_id = sem.id JOIN years y ON sem.year_id = y.id GROUP BY 2""",
+    """INSERT INTO stats SELECT 'program', y.program_id, 'materials', COUNT(*)
+       FROM materials m JOIN subjects s ON m.subject_id = s.id JOIN semesters sem ON s.semester_id = sem.id
+       JOIN years y ON sem.year_id = y.id GROUP BY 2""",
+    """INSERT INTO stats SELECT 'program', y.program_id, 'deadlines', COUNT(*)
+       FROM deadlines d JOIN subjects s ON d.subject_id = s.id JOIN semesters sem ON s.semester_id = sem.id
+       JOIN years y ON sem.year_id = y.id GROUP BY 2""",
+    """INSERT INTO stats_deadline_days SELECT COALESCE(guild_id, 0), date_time, COUNT(*)
+       FROM deadlines WHERE date_time IS NOT NULL GROUP BY 1, 2""",
+]
+
+# Vse številke za nadzorno ploščo in !statistika v eni poizvedbi
+SNAPSHOT_QUERY = """
+    SELECT st.scope, st.scope_id, st.entity, st.count,
+           CASE WHEN st.scope = 'program' THEN (SELECT name FROM study_programs WHERE id = st.scope_id) END AS label
+    FROM stats st
+    WHERE st.scope != 'program' OR st.scope_id IN (SELECT id FROM study_programs)
+    UNION ALL
+    SELECT 'bucket', guild_id,
+           CASE WHEN day < DATE('now') THEN 'past'
+                WHEN day <= DATE('now', '+7 days') THEN 'week'
+                WHEN day <= DATE('now', '+30 days') THEN 'month'
+                ELSE 'later' END,
+           SUM(count), NULL
+    FROM stats_deadline_days
+    GROUP BY 1, 2, 3
+"""
+
+BUCKETS = ("past", "week", "month", "later")
+
+
+def summarize(rows):
+    """Pretvori vrstice SNAPSHOT_QUERY v slovar, ki ga uporabljata bot in admin panel."""
+    out = {"global": {}, "guild": {}, "program": {}, "buckets": {b: 0 for b in BUCKETS}, "guild_buckets": {}}
+    for scope, scope_id, entity, count, label in rows:
+        if scope == "global":
+            out["global"][entity] = count
+        elif scope == "guild":
+            out["guild"].setdefault(scope_id, {})[entity] = count
+        elif scope == "program":
+            prog = out["program"].setdefault(scope_id, {"name": label})
+            prog[entity] = count
+        elif scope == "bucket":
+            out["buckets"][entity] += count
+            out["guild_buckets"].setdefault(scope_id, {b: 0 for b in BUCKETS})[entity] = count
+    return out
+
+
+def visible_buckets(summary, guild_id):
+    """Časovna okna rokov, ki jih vidi strežnik (lastni + globalni roki)."""
+    own = summary["guild_buckets"].get(guild_id, {})
+    shared = summary["guild_buckets"].get(0, {})
+    return {b: own.get(b, 0) + shared.get(b, 0) for b in BUCKETS}